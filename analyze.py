@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from core import VolumeEnvelope
+from wav_reader import WavReader
+from volume_log import read_volume_log_chunks
+
+
+class LoudEvents:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.events = []
+        self.__event = None
+
+    def process(self, times, volumes):
+        for t, volume in zip(times, volumes):
+            if volume >= self.threshold:
+                if self.__event is None:
+                    self.__event = {"start": t, "end": t, "peak": volume, "peak_time": t}
+                else:
+                    self.__event["end"] = t
+                    if volume > self.__event["peak"]:
+                        self.__event["peak"] = volume
+                        self.__event["peak_time"] = t
+            elif self.__event is not None:
+                self.events.append(self.__event)
+                self.__event = None
+
+    def finish(self):
+        if self.__event is not None:
+            self.events.append(self.__event)
+            self.__event = None
+        return self.events
+
+
+def file_start(filename):
+    try:
+        return datetime.strptime(os.path.basename(filename)[:19], "%Y-%m-%d %H-%M-%S").strftime("%Y.%m.%d %H:%M:%S.%f")
+    except ValueError:
+        return None
+
+
+def analyze_wav(filename, volume_T, volume_K, threshold, chunk_size):
+    with WavReader(filename) as reader:
+        volume_N = max(int(reader.samples_per_sec * volume_T / 100), 1)
+        envelope = VolumeEnvelope(volume_N, volume_K)
+        loud_events = LoudEvents(threshold)
+        peak = 0
+        peak_time = 0
+        blocks = 0
+        max_volume = 0
+        max_volume_time = 0
+        volume_sum = 0
+
+        i = 0
+        for values in reader.chunks(chunk_size):
+            amplitudes = np.abs(values.astype(np.int32))
+            if len(amplitudes):
+                j = int(amplitudes.argmax())
+                if amplitudes[j] > peak:
+                    peak = int(amplitudes[j])
+                    peak_time = (i + j) / reader.samples_per_sec
+
+            _, block_volumes = envelope.process(values)
+            if block_volumes:
+                times = (np.arange(blocks, blocks + len(block_volumes)) + 1) * volume_N / reader.samples_per_sec
+                block_volumes = np.array(block_volumes)
+                j = int(block_volumes.argmax())
+                if block_volumes[j] > max_volume:
+                    max_volume = float(block_volumes[j])
+                    max_volume_time = float(times[j])
+                volume_sum += float(block_volumes.sum())
+                blocks += len(block_volumes)
+                loud_events.process(times.tolist(), block_volumes.tolist())
+            i += len(values)
+
+        return {
+            "start": file_start(filename),
+            "samples_per_sec": reader.samples_per_sec,
+            "bits_per_sample": reader.bits_per_sample,
+            "duration": i / reader.samples_per_sec,
+            "peak": peak,
+            "peak_time": peak_time,
+            "volume_samples": blocks,
+            "max_volume": max_volume,
+            "max_volume_time": max_volume_time,
+            "mean_volume": volume_sum / blocks if blocks else 0,
+            "loud_events": loud_events.finish()
+        }
+
+
+def read_text_volume_log(filename, chunk_size):
+    times = []
+    volumes = []
+    with open(filename) as f:
+        for line in f:
+            # meter columns may follow the volume
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2:
+                continue
+            times.append(datetime.strptime(fields[0], "%Y.%m.%d %H:%M:%S.%f").timestamp())
+            volumes.append(float(fields[1]))
+            if len(times) >= chunk_size:
+                yield times, volumes
+                times = []
+                volumes = []
+    if times:
+        yield times, volumes
+
+
+def read_binary_volume_log(filename, chunk_size):
+    for times, volumes in read_volume_log_chunks(filename, chunk_size):
+        yield times.tolist(), volumes.tolist()
+
+
+def analyze_volume_log(filename, threshold, chunk_size):
+    chunks = (read_binary_volume_log if filename.endswith(".vol") else read_text_volume_log)(filename, chunk_size)
+    loud_events = LoudEvents(threshold)
+    start = None
+    end = None
+    count = 0
+    max_volume = 0
+    max_volume_time = 0
+    volume_sum = 0
+    for times, volumes in chunks:
+        if start is None:
+            start = times[0]
+        end = times[-1]
+        j = int(np.argmax(volumes))
+        if volumes[j] > max_volume:
+            max_volume = volumes[j]
+            max_volume_time = times[j] - start
+        volume_sum += sum(volumes)
+        count += len(volumes)
+        loud_events.process([t - start for t in times], volumes)
+
+    return {
+        "start": datetime.fromtimestamp(start).strftime("%Y.%m.%d %H:%M:%S.%f") if start is not None else None,
+        "duration": end - start if start is not None else 0,
+        "volume_samples": count,
+        "max_volume": max_volume,
+        "max_volume_time": max_volume_time,
+        "mean_volume": volume_sum / count if count else 0,
+        "loud_events": loud_events.finish()
+    }
+
+
+def analyze_file(filename, volume_T, volume_K, threshold, chunk_size):
+    t0 = time.perf_counter()
+    try:
+        if filename.endswith((".wav", ".wav.gz")):
+            summary = analyze_wav(filename, volume_T, volume_K, threshold, chunk_size)
+        else:
+            summary = analyze_volume_log(filename, threshold, chunk_size)
+        summary["error"] = None
+    except Exception as e:
+        summary = {"error": str(e)}
+    summary["file"] = os.path.basename(filename)
+    summary["size"] = os.path.getsize(filename)
+    summary["analysis_time"] = time.perf_counter() - t0
+    return summary
+
+
+def find_files(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith((".wav", ".wav.gz", ".txt", ".vol"))
+    )
+
+
+def analyze(files, output, volume_T, volume_K, threshold, chunk_size, workers):
+    with ProcessPoolExecutor(workers) as executor, open(output, "w") as f:
+        futures = [executor.submit(analyze_file, filename, volume_T, volume_K, threshold, chunk_size) for filename in files]
+        for future in futures:
+            summary = future.result()
+            f.write(json.dumps(summary) + "\n")
+            yield summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", nargs="?", default="data")
+    parser.add_argument("--output", default=None, help="summary index, defaults to DIRECTORY/analysis.jsonl")
+    parser.add_argument("--volume-T", type=int, default=10)
+    parser.add_argument("--volume-K", type=float, default=0.1)
+    parser.add_argument("--threshold", type=float, default=16384, help="loud event volume threshold")
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="samples per chunk")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    files = find_files(args.directory)
+    t0 = time.perf_counter()
+    size = 0
+    for summary in analyze(
+        files, args.output or os.path.join(args.directory, "analysis.jsonl"),
+        args.volume_T, args.volume_K, args.threshold, args.chunk_size, args.workers
+    ):
+        size += summary["size"]
+        if summary["error"]:
+            print("%s: %s" % (summary["file"], summary["error"]))
+        else:
+            print("%s: max volume %.2f, %d loud events" % (summary["file"], summary["max_volume"], len(summary["loud_events"])))
+    elapsed = time.perf_counter() - t0
+    print("%d files, %.1f MB in %.1f s (%.1f MB/s)" % (len(files), size / 1e6, elapsed, size / 1e6 / elapsed if elapsed else 0))
@@ -0,0 +1,1397 @@
+import argparse
+import asyncio
+import io
+import os
+import tempfile
+import sys
+import select
+import socket
+import subprocess
+import time
+from threading import Lock, Thread
+import tracemalloc
+import zlib
+from collections import deque
+import numpy as np
+from core import AcPlayer, VolumeEnvelope, decode_samples, make_play_cmd, receive
+from wav import write_wav_header, fix_wav_header, WavWriter
+from volume_log import VolumeLogWriter, read_volume_log, export_text
+from datetime import datetime
+from ring_buffer import RingBuffer
+from scope import Scope
+from decimation import minmax_columns
+import playback
+from playback import Playback
+from pipeline import Chunk, Stage, Pipeline
+from metrics import Metrics
+from spectrum import Spectrogram, decimate_image
+from trigger import TriggeredRecorder
+from meters import MeterBank
+from segments import SegmentedRecorder
+
+
+class ReferenceEnvelope:
+    def __init__(self, volume_N, volume_K):
+        self.volume_N = volume_N
+        self.volume_K = volume_K
+        self.max_amplitude = 0
+        self.count_of_amplitudes = 0
+        self.volume = 0
+
+    def process(self, data, bits_per_sample, values, volumes):
+        bytes_per_sample = int(bits_per_sample / 8)
+        n = len(data)
+        i = 0
+        while i < n:
+            value = int.from_bytes(data[i:i + bytes_per_sample], "little", signed=True)
+            values.append(value)
+
+            amplitude = abs(value)
+            if amplitude > self.max_amplitude:
+                self.max_amplitude = amplitude
+            self.count_of_amplitudes += 1
+            if self.count_of_amplitudes >= self.volume_N:
+                self.volume += (self.max_amplitude - self.volume) * self.volume_K
+                self.max_amplitude = 0
+                self.count_of_amplitudes = 0
+            volumes.append(self.volume)
+
+            i += bytes_per_sample
+
+
+def make_chunks(seconds, samples_per_sec, bits_per_sample, package_size, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(seconds * samples_per_sec)
+    t = np.arange(n) / samples_per_sec
+    amplitude = 127 if bits_per_sample == 8 else 32767
+    signal = amplitude * np.sin(2 * np.pi * 440 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t))
+    signal += rng.normal(0, amplitude * 0.05, n)
+    dtype = np.int8 if bits_per_sample == 8 else "<i2"
+    data = np.clip(signal, -amplitude - 1, amplitude).astype(dtype).tobytes()
+    package_size -= package_size % (bits_per_sample // 8)
+    return [data[i:i + package_size] for i in range(0, len(data), package_size)]
+
+
+def bench_decode(args):
+    volume_N = int(args.samples_per_sec * args.volume_T / 100)
+    chunks = make_chunks(args.seconds, args.samples_per_sec, args.bits_per_sample, args.package_size)
+    samples = sum(len(chunk) for chunk in chunks) // (args.bits_per_sample // 8)
+
+    reference = ReferenceEnvelope(volume_N, args.volume_K)
+    ref_values = []
+    ref_volumes = []
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        reference.process(chunk, args.bits_per_sample, ref_values, ref_volumes)
+    ref_time = time.perf_counter() - t0
+
+    envelope = VolumeEnvelope(volume_N, args.volume_K)
+    values = []
+    volumes = []
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        chunk_values = decode_samples(chunk, args.bits_per_sample)
+        chunk_volumes, _ = envelope.process(chunk_values)
+        values.append(chunk_values)
+        volumes.append(chunk_volumes)
+    new_time = time.perf_counter() - t0
+
+    identical = (
+        np.array_equal(np.concatenate(values), ref_values) and
+        np.array_equal(np.concatenate(volumes), ref_volumes)
+    )
+
+    print("samples: %d (%d chunks of %d B)" % (samples, len(chunks), args.package_size))
+    print("per-sample loop: %.0f samples/s" % (samples / ref_time))
+    print("vectorized:      %.0f samples/s" % (samples / new_time))
+    print("speedup: %.1fx, identical: %s" % (ref_time / new_time, identical))
+
+
+def bench_buffers(args):
+    buffer_size = int(args.viewport_size * args.samples_per_sec / 1000)
+    chunks = make_chunks(args.viewport_size / 1000, args.samples_per_sec, 16, args.package_size)
+    decoded = [decode_samples(chunk, 16) for chunk in chunks]
+
+    tracemalloc.start()
+    values = deque([0 for _ in range(buffer_size)], maxlen=buffer_size)
+    volumes = deque([0 for _ in range(buffer_size)], maxlen=buffer_size)
+    for chunk in decoded:
+        values.extend(chunk.tolist())
+        volumes.extend((chunk * 0.5).tolist())
+    deque_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        np.asarray(values)
+        np.asarray(volumes)
+    deque_time = (time.perf_counter() - t0) / args.repeat
+    del values, volumes
+
+    tracemalloc.start()
+    values = RingBuffer(buffer_size, np.int16)
+    volumes = RingBuffer(buffer_size, np.float32)
+    for chunk in decoded:
+        values.append(chunk)
+        volumes.append(chunk * 0.5)
+    ring_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        values.snapshot()
+        volumes.snapshot()
+    ring_time = (time.perf_counter() - t0) / args.repeat
+
+    print("buffer size: %d samples" % buffer_size)
+    print("deque:       %.1f MB, %.2f ms per frame conversion" % (deque_memory / 1e6, deque_time * 1000))
+    print("ring buffer: %.1f MB, %.2f ms per frame snapshot" % (ring_memory / 1e6, ring_time * 1000))
+
+
+def run_handoff(scope, chunks, chunk_interval, redraw, lock=None):
+    latencies = []
+    frames = [0]
+    done = [False]
+
+    def writer():
+        values = decode_samples(chunks[0], 16)
+        volumes = values.astype(np.float32)
+        next_time = time.perf_counter()
+        for _ in chunks:
+            t0 = time.perf_counter()
+            if lock is not None:
+                with lock:
+                    scope.publish(values, volumes)
+            else:
+                scope.publish(values, volumes)
+            latencies.append(time.perf_counter() - t0)
+            next_time += chunk_interval
+            time.sleep(max(next_time - time.perf_counter(), 0))
+        done[0] = True
+
+    def reader():
+        seq = None
+        while not done[0]:
+            if lock is not None:
+                with lock:
+                    seq, values, volumes = scope.read(seq)
+                    time.sleep(redraw)
+            else:
+                seq, values, volumes = scope.read(seq)
+                time.sleep(redraw)
+            frames[0] += 1
+
+    threads = [Thread(target=writer), Thread(target=reader)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies[len(latencies) * 99 // 100], latencies[-1], frames[0]
+
+
+def bench_handoff(args):
+    buffer_size = int(args.viewport_size * args.samples_per_sec / 1000)
+    chunks = make_chunks(args.seconds, args.samples_per_sec, 16, args.package_size)
+    chunk_interval = args.package_size / 2 / args.samples_per_sec
+    redraw = args.redraw / 1000
+
+    for name, lock in (("mutex held during redraw", Lock()), ("sequence-numbered snapshot", None)):
+        p99, worst, frames = run_handoff(Scope(buffer_size), chunks, chunk_interval, redraw, lock)
+        print("%s: publish p99 %.2f ms, max %.2f ms, %d frames" % (name, p99 * 1000, worst * 1000, frames))
+
+
+def bench_render(args):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(args.width / 100, 4), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.grid(True)
+    ax.set_ylim([-32768, 32768])
+    line1 = ax.plot([], [])[0]
+    line2 = ax.plot([], [])[0]
+
+    for viewport_size in args.viewport_sizes:
+        size = int(viewport_size * args.samples_per_sec / 1000)
+        scope = Scope(size)
+        for chunk in make_chunks(viewport_size / 1000, args.samples_per_sec, 16, 65536):
+            values = decode_samples(chunk, 16)
+            scope.publish(values, np.abs(values).astype(np.float32))
+        ax.set_xlim([0, viewport_size])
+        scale = viewport_size / size
+        columns = int(ax.bbox.width)
+
+        times = []
+        for decimated, blit in ((False, False), (True, False), (True, True)):
+            line1.set_animated(blit)
+            line2.set_animated(blit)
+            canvas.draw()
+            background = canvas.copy_from_bbox(fig.bbox)
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                if decimated:
+                    _, values, volumes = scope.read_minmax()
+                    x, y = minmax_columns(*values, columns)
+                    line1.set_data(x * (scale * scope.bucket_size), y)
+                    x, y = minmax_columns(*volumes, columns)
+                    line2.set_data(x * (scale * scope.bucket_size), y)
+                else:
+                    _, values, volumes = scope.read()
+                    t = np.arange(size) * scale
+                    line1.set_data(t, values)
+                    line2.set_data(t, volumes)
+                if blit:
+                    canvas.restore_region(background)
+                    ax.draw_artist(line1)
+                    ax.draw_artist(line2)
+                    canvas.blit(ax.bbox)
+                else:
+                    canvas.draw()
+            times.append((time.perf_counter() - t0) / args.repeat)
+        print("viewport %6d ms (%7d samples): full %.1f ms, min/max %.1f ms, min/max + blit %.1f ms per frame" % (
+            viewport_size, size, times[0] * 1000, times[1] * 1000, times[2] * 1000
+        ))
+
+
+def feed_scope(scope, spectrogram, samples_per_sec, package_size, stop):
+    values = decode_samples(b"".join(make_chunks(10, samples_per_sec, 16, package_size)), 16)
+    samples = package_size // 2
+    t0 = time.perf_counter()
+    i = 0
+    while not stop.is_set():
+        chunk = values[i % len(values):i % len(values) + samples]
+        scope.publish(chunk, np.abs(chunk).astype(np.float32))
+        spectrogram.process(chunk)
+        i += samples
+        time.sleep(max(t0 + i / samples_per_sec - time.perf_counter(), 0))
+
+
+def bench_responsiveness(args):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from threading import Event
+    from PySide6.QtWidgets import QApplication, QHBoxLayout, QWidget
+    from PySide6.QtCore import QTimer
+    from main_window import FrameView
+    from renderer import ScopeRenderer, SpectrumRenderer
+
+    app = QApplication.instance() or QApplication([])
+    sps = args.samples_per_sec
+    print("viewport %d ms at %d Hz, update interval %d ms, %.0f s per run, event loop probed every %d ms" % (
+        args.viewport_size, sps, args.interval, args.seconds, args.probe
+    ))
+    for decimation in (True, False):
+        for threaded in (False, True):
+            scope = Scope(int(args.viewport_size * sps / 1000))
+            spectrogram = Spectrogram(sps)
+            stop = Event()
+            feeder = Thread(target=feed_scope, args=(scope, spectrogram, sps, args.package_size, stop), daemon=True)
+            feeder.start()
+
+            renderers = [ScopeRenderer(lambda: scope, args.interval), SpectrumRenderer(lambda: spectrogram, args.interval)]
+            renderers[0].set_decimation(decimation)
+            renderers[0].configure(args.viewport_size, 32768)
+            window = QWidget()
+            layout = QHBoxLayout(window)
+            views = [FrameView(renderer) for renderer in renderers]
+            for view in views:
+                layout.addWidget(view)
+            window.resize(1400, 500)
+            window.show()
+
+            if threaded:
+                for renderer in renderers:
+                    renderer.start()
+                timer = None
+            else:
+                # what MainWindow did before: the whole render in a timer callback on the GUI thread
+                timer = QTimer()
+                timer.setInterval(args.interval)
+                timer.timeout.connect(lambda: [view.show_frame(view.renderer.render()) for view in views])
+                timer.start()
+
+            gaps = []
+            last = [time.perf_counter()]
+
+            def probe():
+                now = time.perf_counter()
+                gaps.append(now - last[0])
+                last[0] = now
+
+            probe_timer = QTimer()
+            probe_timer.setInterval(args.probe)
+            probe_timer.timeout.connect(probe)
+            probe_timer.start()
+            QTimer.singleShot(int(args.seconds * 1000), app.quit)
+            cpu0 = time.process_time()
+            app.exec()
+            cpu = time.process_time() - cpu0
+
+            probe_timer.stop()
+            if timer is not None:
+                timer.stop()
+            for renderer in renderers:
+                renderer.stop()
+                renderer.on_frame = None
+            # frames announced before the stop are still queued for the views
+            app.processEvents()
+            stop.set()
+            feeder.join()
+            window.close()
+            window.deleteLater()
+            app.processEvents()
+
+            late = np.maximum(np.array(gaps[1:]) - args.probe / 1000, 0) * 1000
+            frames = renderers[0].frames if threaded else None
+            print("%-8s %-10s event loop late p50 %6.1f ms, p99 %6.1f ms, max %6.1f ms, %s, %d skipped, cpu %.0f%%" % (
+                "min/max" if decimation else "full", "worker" if threaded else "GUI thread",
+                np.percentile(late, 50), np.percentile(late, 99), late.max(),
+                "%.1f scope fps" % (frames / args.seconds) if threaded else "frame every tick",
+                sum(renderer.skipped for renderer in renderers), cpu / args.seconds * 100
+            ))
+
+
+def reference_receive(s, package_size, bytes_per_sample, timeout, process):
+    rem = b""
+    while True:
+        sockets = [s]
+        rlist, _, xlist = select.select(sockets, [], sockets, timeout)
+        if xlist:
+            break
+        if rlist:
+            data = rem + s.recv(package_size)
+
+            n = len(data)
+            if n == 0:
+                break
+
+            if n % 2 == 1:
+                rem = data[-1:]
+                data = data[:-1]
+                n -= 1
+            else:
+                rem = b""
+
+            process(data)
+
+
+class TracedSocket:
+    def __init__(self, s):
+        self.s = s
+        self.base = 0
+        self.blocks = 0
+
+    def fileno(self):
+        return self.s.fileno()
+
+    def recv(self, n):
+        self.__mark()
+        return self.s.recv(n)
+
+    def recv_into(self, buffer):
+        self.__mark()
+        return self.s.recv_into(buffer)
+
+    def __mark(self):
+        self.blocks = len(tracemalloc.take_snapshot().traces)
+        tracemalloc.reset_peak()
+        self.base = tracemalloc.get_traced_memory()[0]
+
+
+def run_receive(loop, data, package_size, bytes_per_sample, traced, seed=0):
+    a, b = socket.socketpair()
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, 2 * package_size, len(data) // package_size + 1).tolist()
+
+    def send():
+        i = 0
+        for size in sizes:
+            a.sendall(data[i:i + size])
+            i += size
+        a.sendall(data[i:])
+        a.shutdown(socket.SHUT_WR)
+
+    crc = [0, 0, True]
+    transient = []
+    blocks = []
+    s = TracedSocket(b) if traced else b
+
+    def process(chunk):
+        if traced:
+            current, peak = tracemalloc.get_traced_memory()
+            transient.append(max(peak, current) - s.base)
+            blocks.append(len(tracemalloc.take_snapshot().traces) - s.blocks)
+        crc[0] = zlib.crc32(chunk, crc[0])
+        crc[1] += len(chunk)
+        crc[2] = crc[2] and len(chunk) % bytes_per_sample == 0
+
+    thread = Thread(target=send)
+    thread.start()
+    if traced:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    loop(s, package_size, bytes_per_sample, 5, process)
+    elapsed = time.perf_counter() - t0
+    if traced:
+        tracemalloc.stop()
+    thread.join()
+    a.close()
+    b.close()
+    return crc, elapsed, transient, blocks
+
+
+def bench_receive(args):
+    data = b"".join(make_chunks(args.seconds, args.samples_per_sec, 16, args.package_size))
+    bytes_per_sec = args.samples_per_sec * 2
+    print("%.1f MB in random 1..%d B sends, %d B packages" % (len(data) / 1e6, 2 * args.package_size, args.package_size))
+    for name, loop in (("concat", reference_receive), ("recv_into", receive)):
+        crc, elapsed, _, _ = run_receive(loop, data, args.package_size, 2, False)
+        _, _, transient, blocks = run_receive(loop, data, args.package_size, 2, True)
+        packages = len(transient)
+        print("%-9s %.0f MB/s, peak %.0f B and %.1f new live blocks per package, %.0f KB/s allocated at %d Hz, intact %s" % (
+            name, len(data) / elapsed / 1e6, sum(transient) / packages, sum(blocks) / packages,
+            sum(transient) / packages * (bytes_per_sec / (crc[1] / packages)) / 1024, args.samples_per_sec,
+            crc[0] == zlib.crc32(data) and crc[1] == len(data) and crc[2]
+        ))
+
+
+def bench_pipeline(args):
+    chunks = make_chunks(args.seconds, args.samples_per_sec, 16, args.package_size)
+    interval = args.package_size / (args.samples_per_sec * 2)
+    stall_every = max(int(args.stall_interval / interval), 1)
+
+    def make_sinks():
+        scope = Scope(args.samples_per_sec)
+        recorded = bytearray()
+        calls = [0]
+
+        def analyzer(chunk):
+            calls[0] += 1
+            if calls[0] % stall_every == 0:
+                time.sleep(args.stall / 1000)
+
+        return [
+            ("scope", lambda chunk: scope.publish(chunk.values, chunk.volumes), "coalesce", 4),
+            ("record", lambda chunk: recorded.extend(chunk.data), "block", 256),
+            ("analyzer", analyzer, "drop-oldest", 16)
+        ]
+
+    def run(mode):
+        envelope = VolumeEnvelope(int(args.samples_per_sec * 10 / 100), 0.1)
+        sinks = make_sinks()
+        latencies = {name: [] for name, _, _, _ in sinks}
+        pipeline = Pipeline()
+        if mode == "stages":
+            for name, process, policy, max_queue in sinks:
+                pipeline.add(Stage(name, process, policy, max_queue))
+        ingest = []
+        start = time.perf_counter()
+        for i, data in enumerate(chunks):
+            arrival = start + i * interval
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            t0 = time.perf_counter()
+            values = decode_samples(data, 16)
+            volumes, block_volumes = envelope.process(values)
+            chunk = Chunk(data, values, volumes, block_volumes, time.monotonic_ns())
+            if mode == "stages":
+                pipeline.publish(chunk)
+            else:
+                for name, process, _, _ in sinks:
+                    process(chunk)
+                    latencies[name].append(time.perf_counter() - arrival)
+            ingest.append(time.perf_counter() - t0)
+        behind = time.perf_counter() - start - len(chunks) * interval
+        stats = pipeline.stats()
+        pipeline.stop()
+
+        print("%-7s ingest mean %.3f ms, max %.1f ms, finished %.1f s behind real time" % (
+            mode, np.mean(ingest) * 1000, np.max(ingest) * 1000, max(behind, 0)
+        ))
+        if mode == "stages":
+            for stat in stats:
+                print("  {name:<9} {policy:<12} latency mean {latency_mean:.1f} ms, max {latency_max:.1f} ms, "
+                      "max depth {max_depth}, dropped {dropped}, coalesced {coalesced}, blocked {blocked}".format(**stat))
+        else:
+            for name, values in latencies.items():
+                print("  %-9s latency mean %.1f ms, max %.1f ms" % (name, np.mean(values) * 1000, np.max(values) * 1000))
+
+    print("%d packages over %.0f s, analyzer stalls %.0f ms every %.1f s" % (len(chunks), args.seconds, args.stall, args.stall_interval))
+    run("inline")
+    run("stages")
+
+
+def bench_metrics(args):
+    data = b"".join(make_chunks(args.seconds, args.samples_per_sec, 16, 1 << 20))
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "replay.wav")
+        with open(filename, "wb") as f:
+            write_wav_header(f, args.samples_per_sec, 1, 16)
+            f.write(data)
+            fix_wav_header(f, len(data))
+
+        packages = len(data) // args.package_size
+        print("replaying %.0f s as fast as possible, %d packages of %d B" % (args.seconds, packages, args.package_size))
+        results = {}
+        for _ in range(args.repeat):
+            for name in ("disabled", "enabled"):
+                metrics = Metrics() if name == "enabled" else None
+                ac_player = AcPlayer(metrics)
+                t0 = time.perf_counter()
+                ac_player.replay(filename, args.package_size, 0, 10, 0.1, 20000)
+                while ac_player.connected():
+                    time.sleep(0.001)
+                elapsed = time.perf_counter() - t0
+                results[name] = min(results.get(name, elapsed), elapsed)
+                if metrics:
+                    snapshot = metrics.snapshot()
+        for name, elapsed in results.items():
+            print("%-8s %.1f us per package" % (name, elapsed / packages * 1e6))
+        print("overhead %.1f us per package" % ((results["enabled"] - results["disabled"]) / packages * 1e6))
+        print(metrics.log_line(snapshot, None))
+
+
+def bench_spectrum(args):
+    values = decode_samples(b"".join(make_chunks(args.seconds, args.samples_per_sec, 16, 65536)), 16)
+    window = np.hanning(args.fft_size)
+    scale = 2 / (window.sum() * 32768)
+    print("%.0f s at %d Hz, FFT %d, hop %d" % (args.seconds, args.samples_per_sec, args.fft_size, args.hop))
+
+    t0 = time.perf_counter()
+    columns = []
+    for i in range(0, len(values) - args.fft_size + 1, args.hop):
+        spectrum = np.abs(np.fft.rfft(values[i:i + args.fft_size] * window)) * scale
+        columns.append(20 * np.log10(np.maximum(spectrum, 1e-10)))
+    elapsed = time.perf_counter() - t0
+    print("per frame        %.1f ms per second of audio, %.0fx real time" % (elapsed / args.seconds * 1000, args.seconds / elapsed))
+    reference = np.array(columns[-100:], dtype=np.float32)
+
+    for package_size in args.package_sizes:
+        samples = package_size // 2
+        spectrogram = Spectrogram(args.samples_per_sec, args.fft_size, args.hop)
+        t0 = time.perf_counter()
+        for i in range(0, len(values), samples):
+            spectrogram.process(values[i:i + samples])
+        elapsed = time.perf_counter() - t0
+        _, image = spectrogram.read()
+        print("batched %6d B %.1f ms per second of audio, %.0fx real time, %d frames, max diff %.1e dB" % (
+            package_size, elapsed / args.seconds * 1000, args.seconds / elapsed, spectrogram.frames,
+            np.abs(image[-100:] - reference).max()
+        ))
+
+    t0 = time.perf_counter()
+    for _ in range(10):
+        decimate_image(image, 400, 200)
+    print("image decimation to 400x200: %.2f ms" % ((time.perf_counter() - t0) / 10 * 1000))
+
+
+def separate_meters(spec, block_size, bits_per_sample, samples_per_sec):
+    # the bolt-on alternative: one bank per meter, each with its own pass over the samples
+    return [MeterBank(block_size, bits_per_sample, [meter], samples_per_sec) for meter in spec]
+
+
+def bench_meters(args):
+    from meters import parse_meters
+
+    values = decode_samples(b"".join(make_chunks(args.seconds, args.samples_per_sec, 16, args.package_size)), 16)
+    samples = args.package_size // 2
+    block_size = int(args.samples_per_sec * args.volume_T / 100)
+    kinds = parse_meters("peak:1.5,rms:0.3,rms:3,clip,peak:0,rms:1,rms:10,peak:0.5")
+    print("%.0f s at %d Hz, %d B packets, %d sample blocks" % (args.seconds, args.samples_per_sec, args.package_size, block_size))
+
+    envelope = VolumeEnvelope(block_size, args.volume_K)
+    t0 = time.perf_counter()
+    for i in range(0, len(values), samples):
+        envelope.process(values[i:i + samples])
+    print("envelope only      %.3f ms per second of audio" % ((time.perf_counter() - t0) / args.seconds * 1000))
+
+    for count in args.counts:
+        spec = [(name + "#%d" % i, kind, tau) for i, (name, kind, tau) in enumerate((kinds * count)[:count])]
+        bank = MeterBank(block_size, 16, spec, args.samples_per_sec)
+        t0 = time.perf_counter()
+        out = [bank.process(values[i:i + samples]) for i in range(0, len(values), samples)]
+        banked = time.perf_counter() - t0
+
+        singles = separate_meters(spec, block_size, 16, args.samples_per_sec)
+        t0 = time.perf_counter()
+        reference = [
+            np.hstack([meter.process(values[i:i + samples]) for meter in singles])
+            for i in range(0, len(values), samples)
+        ]
+        separate = time.perf_counter() - t0
+
+        print("%2d meters  bank %.3f ms, separate %.3f ms per second of audio, max diff %.1e" % (
+            count, banked / args.seconds * 1000, separate / args.seconds * 1000,
+            np.abs(np.concatenate(out) - np.concatenate(reference)).max()
+        ))
+
+
+def bench_trigger(args):
+    from wav_reader import WavReader
+
+    rng = np.random.default_rng(0)
+    sps = args.samples_per_sec
+    n = int(args.seconds * sps)
+    onsets = np.sort(rng.choice(np.arange(args.pre_roll * sps, n - 2 * sps, sps // 10), args.events, replace=False))
+    lengths = (rng.uniform(0.3, 2, args.events) * sps).astype(np.int64)
+    bursts = [
+        (8000 * np.sin(2 * np.pi * 1000 * np.arange(length) / sps) * np.exp(-np.arange(length) / length)).astype(np.int32)
+        for length in lengths.tolist()
+    ]
+    package_samples = args.package_size // 2
+    envelope = VolumeEnvelope(int(sps * args.volume_T / 100), args.volume_K)
+
+    with tempfile.TemporaryDirectory() as directory:
+        wall_offset = time.time() - time.monotonic()
+        recorder = TriggeredRecorder(sps, 16, args.attack, args.release, args.pre_roll, args.hold, directory=directory)
+        cpu = 0
+        for i in range(0, n, package_samples):
+            m = min(package_samples, n - i)
+            values = rng.normal(0, args.noise, m).astype(np.int32)
+            for k in range(max(np.searchsorted(onsets, i - 2 * sps), 0), np.searchsorted(onsets, i + m)):
+                a, b = max(onsets[k], i), min(onsets[k] + lengths[k], i + m)
+                if a < b:
+                    values[a - i:b - i] += bursts[k][a - onsets[k]:b - onsets[k]]
+            values = np.clip(values, -32768, 32767).astype("<i2")
+            t0 = time.process_time()
+            volumes, _ = envelope.process(values)
+            recorder.process(values, volumes, int((i + m) / sps * 1e9))
+            cpu += time.process_time() - t0
+        recorder.close()
+
+        size = 0
+        quiet_starts = 0
+        covered = np.zeros(args.events, dtype=bool)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            size += os.path.getsize(path)
+            # segment names carry the wall time of their first sample, the samples here are timed from 0
+            start = (time.mktime(time.strptime(name[:19], "%Y-%m-%d %H-%M-%S")) + int(name[20:23]) / 1000 - wall_offset) * sps
+            with WavReader(path) as reader:
+                covered |= (onsets >= start - sps / 100) & (onsets < start + len(reader))
+                head = reader.read(0, int(args.pre_roll * sps / 2))
+                quiet_starts += len(head) > 0 and np.abs(head.astype(np.int32)).max() < 6 * args.noise
+
+    print("%.0f s at %d Hz, %d events of 0.3-2 s over noise with sigma %d" % (args.seconds, sps, args.events, args.noise))
+    print("continuous    %.1f MB" % (n * 2 / 1e6))
+    print("triggered     %.2f MB in %d segments (%.0fx less), %d of %d onsets inside, %d segments start in quiet pre-roll" % (
+        size / 1e6, recorder.events, n * 2 / max(size, 1), covered.sum(), args.events, quiet_starts
+    ))
+    print("envelope and trigger: %.2f ms of CPU per second of audio" % (cpu / args.seconds * 1000))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_transmitter(port, speed, chunk_size, burst, disconnect_after=0, stall=0):
+    process = subprocess.Popen([
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_transmitter.py"),
+        "--port", str(port), "--speed", str(speed), "--chunk-size", str(chunk_size), "--burst", str(burst),
+        "--disconnect-after", str(disconnect_after), "--stall", str(stall)
+    ], stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.1).close()
+            return process
+        except OSError:
+            if time.monotonic() > deadline:
+                process.kill()
+                raise
+            time.sleep(0.05)
+
+
+def run_stream(args, package_size, samples_per_sec, bits_per_sample, speed):
+    bytes_per_sec = samples_per_sec * bits_per_sample // 8
+    interval = args.chunk_size / bytes_per_sec / speed if speed else 0
+    received = [0]
+    latencies = []
+
+    def on_data(values):
+        now = time.monotonic()
+        received[0] += len(values) * (bits_per_sample // 8)
+        if interval:
+            chunk = (received[0] - 1) // args.chunk_size
+            latencies.append(now - (start + chunk // args.burst * args.burst * interval))
+
+    port = free_port()
+    process = start_transmitter(port, speed, args.chunk_size, args.burst)
+    try:
+        ac_player = AcPlayer(analyze=not args.headless)
+        ac_player.on_data = on_data
+        start = time.monotonic()
+        ac_player.connect("127.0.0.1", port, package_size, 5000, "0000", samples_per_sec, bits_per_sample, 10, 0.1, 20000)
+        time.sleep(args.warmup)
+        r0, c0, t0 = received[0], time.process_time(), time.monotonic()
+        time.sleep(args.seconds)
+        r1, c1, t1 = received[0], time.process_time(), time.monotonic()
+        ac_player.disconnect()
+    finally:
+        process.kill()
+        process.wait()
+
+    result = {
+        "samples_per_sec": (r1 - r0) / (bits_per_sample // 8) / (t1 - t0),
+        "cpu": (c1 - c0) / (t1 - t0)
+    }
+    if interval:
+        latencies = sorted(latencies)
+        expected = int((t1 - start) / interval) * args.chunk_size
+        result.update({
+            "latency_p50": latencies[len(latencies) // 2] if latencies else float("nan"),
+            "latency_p99": latencies[len(latencies) * 99 // 100] if latencies else float("nan"),
+            "latency_max": latencies[-1] if latencies else float("nan"),
+            "late": sum(latency > args.late_threshold / 1000 for latency in latencies) / max(len(latencies), 1),
+            "behind": max(expected - r1, 0) / bytes_per_sec
+        })
+    return result
+
+
+def bench_stream(args):
+    print("package  rate    bits  max samples/s  speedup  cpu@%gx  latency p50/p99/max [ms]  late    behind [ms]" % args.speed)
+    for package_size in args.package_sizes:
+        for samples_per_sec in args.samples_per_sec:
+            for bits_per_sample in args.bits_per_sample:
+                unthrottled = run_stream(args, package_size, samples_per_sec, bits_per_sample, 0)
+                paced = run_stream(args, package_size, samples_per_sec, bits_per_sample, args.speed)
+                print("%-8d %-7d %-5d %-14.0f %-8.1f %-7s %-25s %-7s %.0f" % (
+                    package_size, samples_per_sec, bits_per_sample,
+                    unthrottled["samples_per_sec"],
+                    unthrottled["samples_per_sec"] / samples_per_sec,
+                    "%.1f%%" % (paced["cpu"] * 100),
+                    "%.1f/%.1f/%.1f" % (paced["latency_p50"] * 1000, paced["latency_p99"] * 1000, paced["latency_max"] * 1000),
+                    "%.1f%%" % (paced["late"] * 100),
+                    paced["behind"] * 1000
+                ))
+
+
+class SlowFileIO(io.FileIO):
+    writes = 0
+    latency = 0
+
+    def write(self, b):
+        SlowFileIO.writes += 1
+        time.sleep(SlowFileIO.latency)
+        return super().write(b)
+
+
+def bench_reconnect(args):
+    from session_index import connect, find_gaps
+    from wav_reader import WavReader
+
+    port = free_port()
+    process = start_transmitter(port, 1, 4096, 1, args.disconnect_after, args.stall)
+    try:
+        ac_player = AcPlayer(analyze=False)
+        start = time.time()
+        ac_player.connect(
+            "127.0.0.1", port, 4096, args.timeout, "0000", args.samples_per_sec, 16, 10, 0.1, 0,
+            reconnect=True, max_backoff=args.max_backoff
+        )
+        existing = set(os.listdir("data")) if os.path.isdir("data") else set()
+        ac_player.start_record(max_gap_fill=args.max_gap_fill)
+        time.sleep(args.seconds)
+        ac_player.stop_record()
+        filenames = sorted(name for name in set(os.listdir("data")) - existing if name.endswith(".wav"))
+        elapsed = time.time() - start
+        ac_player.disconnect()
+    finally:
+        process.kill()
+        process.wait()
+
+    time.sleep(1.5)
+    duration = 0
+    for filename in filenames:
+        with WavReader(os.path.join("data", filename)) as reader:
+            duration += reader.duration()
+    with connect() as connection:
+        gaps = find_gaps(connection, start, float("inf"))
+    downtimes = [end - gap_start for _, gap_start, end, _ in gaps]
+    print("%.1f s captured over %d drops (%.1f s stream, %.1f s stall, %.1f s idle timeout)" % (
+        elapsed, len(gaps), args.disconnect_after, args.stall, args.timeout / 1000
+    ))
+    print("%d reconnects, %.1f s down, downtime per drop mean %.2f s, max %.2f s" % (
+        ac_player.reconnects(), ac_player.downtime(),
+        np.mean(downtimes) if downtimes else 0, max(downtimes, default=0)
+    ))
+    print("%d recording(s), %.2f s long for %.2f s of wall clock (%+.2f s)" % (len(filenames), duration, elapsed, duration - elapsed))
+
+
+def process_cpu(pid):
+    try:
+        with open("/proc/%d/stat" % pid) as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except OSError:
+        return float("nan")
+
+
+async def run_listeners(port, count, slow, samples_per_sec, seconds):
+    received = [0] * count
+    accepted = [0]
+    connections = []
+
+    async def listen(i):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        connections.append(writer)
+        writer.write(make_play_cmd("0000", samples_per_sec, 16))
+        if await reader.read(1) != b"\x01":
+            return
+        accepted[0] += 1
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            received[i] += len(data)
+
+    async def stall():
+        # a receiver that stops reading: its socket buffers fill up and the sender has to deal with it
+        s = socket.socket()
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        s.connect(("127.0.0.1", port))
+        s.send(make_play_cmd("0000", samples_per_sec, 16))
+        connections.append(s)
+
+    tasks = [asyncio.ensure_future(listen(i)) for i in range(count)]
+    for _ in range(slow):
+        await stall()
+    await asyncio.sleep(1)
+    start = list(received)
+    await asyncio.sleep(seconds)
+    rates = [(r - r0) / seconds for r, r0 in zip(received, start)]
+    for task in tasks:
+        task.cancel()
+    for connection in connections:
+        connection.close()
+    return rates, accepted[0]
+
+
+def bench_relay(args):
+    bytes_per_sec = args.samples_per_sec * 2
+    print("%d receivers and %d stalled ones, %d Hz 16 bit (%.0f KB/s per receiver)" % (
+        args.clients, args.slow, args.samples_per_sec, bytes_per_sec / 1000
+    ))
+    for mode in ("direct", "relay"):
+        transmitter_port = free_port()
+        transmitter = start_transmitter(transmitter_port, 1, 4096, 1)
+        relay = None
+        try:
+            port = transmitter_port
+            if mode == "relay":
+                port = free_port()
+                relay = subprocess.Popen([
+                    sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "relay.py"),
+                    "--port", str(transmitter_port), "--samples-per-sec", str(args.samples_per_sec),
+                    "--listen-address", "127.0.0.1", "--listen-port", str(port), "--max-buffer", str(args.max_buffer),
+                    "--stat-interval", "3600"
+                ], stdout=subprocess.DEVNULL)
+                deadline = time.monotonic() + 10
+                while True:
+                    try:
+                        socket.create_connection(("127.0.0.1", port), 0.1).close()
+                        break
+                    except OSError:
+                        if time.monotonic() > deadline:
+                            raise
+                        time.sleep(0.05)
+            cpu = [process_cpu(p.pid) for p in (transmitter, relay) if p is not None]
+            t0 = time.monotonic()
+            rates, accepted = asyncio.run(run_listeners(port, args.clients, args.slow, args.samples_per_sec, args.seconds))
+            elapsed = time.monotonic() - t0
+            cpu = [(process_cpu(p.pid) - c) / elapsed * 100 for p, c in zip((transmitter, relay), cpu)]
+        finally:
+            for p in (transmitter, relay):
+                if p is not None:
+                    p.kill()
+                    p.wait()
+        print("%-6s  %d/%d accepted, receiver rate min %.0f%% mean %.0f%% of real time, transmitter cpu %.1f%%, uploads %d streams%s" % (
+            mode, accepted, args.clients, min(rates) / bytes_per_sec * 100, np.mean(rates) / bytes_per_sec * 100,
+            cpu[0], args.clients + args.slow if mode == "direct" else 1,
+            ", relay cpu %.1f%%" % cpu[1] if mode == "relay" else ""
+        ))
+
+
+def bench_wav(args):
+    import wav
+
+    chunks = make_chunks(args.seconds, args.samples_per_sec, 16, args.package_size)
+    SlowFileIO.latency = args.disk_latency / 1000
+    wav.open = lambda filename, mode, buffering: SlowFileIO(filename, mode.replace("b", ""))
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "direct.wav")
+        f = io.BufferedRandom(SlowFileIO(filename, "w+"))
+        write_wav_header(f, args.samples_per_sec, 1, 16)
+        recorded = 0
+        times = []
+        t0 = time.perf_counter()
+        for chunk in chunks:
+            t = time.perf_counter()
+            f.write(chunk)
+            recorded += len(chunk)
+            times.append(time.perf_counter() - t)
+        fix_wav_header(f, recorded)
+        f.close()
+        direct = (time.perf_counter() - t0, max(times), sum(times) / len(times), SlowFileIO.writes)
+        SlowFileIO.writes = 0
+
+        filename = os.path.join(directory, "buffered.wav")
+        writer = WavWriter(filename, args.samples_per_sec, 1, 16, block_size=args.block_size, header_interval=args.header_interval)
+        times = []
+        t0 = time.perf_counter()
+        for chunk in chunks:
+            t = time.perf_counter()
+            writer.write(chunk)
+            times.append(time.perf_counter() - t)
+        writer.close()
+        buffered = (time.perf_counter() - t0, max(times), sum(times) / len(times), SlowFileIO.writes)
+        size = os.path.getsize(filename)
+
+    print("%d packets of %d B, %.1f MB, %.1f ms per write syscall" % (len(chunks), args.package_size, size / 1e6, args.disk_latency))
+    for name, (total, worst, mean, writes) in (("direct", direct), ("WavWriter", buffered)):
+        print("%-10s total %.1f ms, ingest mean %.2f us, max %.2f us, %d write syscalls" % (
+            name, total * 1000, mean * 1e6, worst * 1e6, writes
+        ))
+
+
+def bench_compression(args):
+    from wav_reader import WavReader
+
+    rng = np.random.default_rng(0)
+    sps = args.samples_per_sec
+    n = int(args.seconds * sps)
+    t = np.arange(n) / sps
+    signals = (
+        ("tone", 8000 * np.sin(2 * np.pi * 440 * t) + rng.normal(0, 20, n)),
+        ("noise", rng.normal(0, 3000, n)),
+        ("quiet", rng.normal(0, 20, n))
+    )
+    package_samples = args.package_size // 2
+    volumes = np.zeros(package_samples)
+
+    print("%.0f s at %d Hz per signal fed at %gx real time, %.0f s segments, %d B packets" % (
+        args.seconds, sps, args.speed, args.segment_seconds, args.package_size
+    ))
+    for name, signal in signals:
+        values = np.clip(signal, -32768, 32767).astype("<i2")
+        for level in [None] + args.levels:
+            with tempfile.TemporaryDirectory() as directory:
+                recorder = SegmentedRecorder(
+                    sps, 16, args.segment_seconds, compression=None if level is None else "gzip",
+                    directory=directory
+                )
+                if level is not None:
+                    # the level is a WavWriter knob, the recorder keeps the default
+                    recorder_open = WavWriter.__init__
+
+                    def init(self, *a, **kw):
+                        kw["level"] = level
+                        recorder_open(self, *a, **kw)
+
+                    WavWriter.__init__ = init
+                worst = 0
+                cpu0 = time.process_time()
+                t0 = time.perf_counter()
+                try:
+                    for i in range(0, n, package_samples):
+                        # paced like a live stream sped up, so the encoder thread keeps up as it would at 1x
+                        delay = t0 + i / sps / args.speed - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                        chunk = values[i:i + package_samples]
+                        t1 = time.perf_counter()
+                        recorder.process(chunk, volumes[:len(chunk)])
+                        worst = max(worst, time.perf_counter() - t1)
+                    recorder.close()
+                finally:
+                    if level is not None:
+                        WavWriter.__init__ = recorder_open
+                cpu = time.process_time() - cpu0
+
+                files = sorted(os.listdir(directory))
+                size = sum(os.path.getsize(os.path.join(directory, f)) for f in files)
+                decoded = []
+                for f in files:
+                    with WavReader(os.path.join(directory, f)) as reader:
+                        decoded.append(reader.read().copy())
+                lossless = np.array_equal(np.concatenate(decoded), values)
+
+            print("%-6s %-5s %6.2f MB (%5.1f%%), cpu %6.2f ms per second of audio, max process() %.2f ms, %d files, %s" % (
+                name, "raw" if level is None else "gz-%d" % level, size / 1e6, size / (n * 2) * 100,
+                cpu / args.seconds * 1000, worst * 1000, len(files), "lossless" if lossless else "MISMATCH"
+            ))
+
+
+def bench_volume_log(args):
+    volume_N = int(args.samples_per_sec * args.volume_T / 100)
+    chunks = [decode_samples(chunk, 16) for chunk in make_chunks(args.seconds, args.samples_per_sec, 16, args.package_size)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        envelope = VolumeEnvelope(volume_N, args.volume_K)
+        text_filename = os.path.join(directory, "volume.txt")
+        spent = 0
+        with open(text_filename, "w") as f:
+            for values in chunks:
+                _, block_volumes = envelope.process(values)
+                t0 = time.perf_counter()
+                for volume in block_volumes:
+                    f.write("{}\t{:.2f}\n".format(datetime.now().strftime("%Y.%m.%d %H:%M:%S.%f"), volume))
+                spent += time.perf_counter() - t0
+        text = (spent, os.path.getsize(text_filename))
+
+        envelope = VolumeEnvelope(volume_N, args.volume_K)
+        binary_filename = os.path.join(directory, "volume.vol")
+        spent = 0
+        writer = VolumeLogWriter(binary_filename)
+        for values in chunks:
+            _, block_volumes = envelope.process(values)
+            t0 = time.perf_counter()
+            if block_volumes:
+                writer.append(time.monotonic_ns(), block_volumes)
+            spent += time.perf_counter() - t0
+        writer.close()
+        binary = (spent, os.path.getsize(binary_filename))
+        records = writer.recorded
+
+        export_text(binary_filename, os.path.join(directory, "exported.txt"))
+        _, volumes = read_volume_log(binary_filename)
+
+    print("%d volume samples" % records)
+    for name, (spent, size) in (("text", text), ("binary", binary)):
+        print("%-7s %.2f us per sample on the ingest thread, %d B" % (name, spent / records * 1e6, size))
+    print("size ratio %.1fx, read back %d samples" % (text[1] / binary[1], len(volumes)))
+
+
+def bench_analyze(args):
+    from analyze import analyze, find_files
+
+    data = b"".join(make_chunks(args.seconds, args.samples_per_sec, 16, 1 << 20))
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(args.files):
+            with open(os.path.join(directory, "%04d.wav" % i), "wb") as f:
+                write_wav_header(f, args.samples_per_sec, 1, 16)
+                f.write(data)
+                fix_wav_header(f, len(data))
+        files = find_files(directory)
+        size = args.files * len(data)
+
+        base = None
+        for workers in args.workers:
+            t0 = time.perf_counter()
+            for _ in analyze(files, os.path.join(directory, "analysis.jsonl"), 10, 0.1, 16384, 1 << 20, workers):
+                pass
+            elapsed = time.perf_counter() - t0
+            base = base or elapsed * workers
+            print("%d workers: %.1f MB/s, %.1fx realtime, scaling efficiency %.0f%%" % (
+                workers, size / 1e6 / elapsed, args.files * args.seconds / elapsed, base / elapsed / workers * 100
+            ))
+
+
+def simulate_playback(playback, chunks, samples_per_sec, jitter, stall_interval, stall, drift, seed=0):
+    rng = np.random.default_rng(seed)
+    package_samples = len(chunks[0]) // 2
+    sent = np.arange(len(chunks)) * package_samples / samples_per_sec
+    arrivals = sent + rng.exponential(jitter / 1000, len(chunks))
+    if stall_interval:
+        # stalled packets arrive together when the link recovers
+        phase = sent % stall_interval
+        stalled = phase < stall / 1000
+        arrivals[stalled] = np.maximum(arrivals[stalled], sent[stalled] - phase[stalled] + stall / 1000)
+    arrivals = np.maximum.accumulate(arrivals)
+
+    frames = playback.frames_per_buffer
+    period = frames / samples_per_sec / (1 + drift / 100)
+    depths = []
+    write_times = []
+    i = 0
+    t = period
+    while i < len(chunks):
+        while i < len(chunks) and arrivals[i] <= t:
+            t0 = time.perf_counter()
+            playback.write(chunks[i])
+            write_times.append(time.perf_counter() - t0)
+            i += 1
+        playback.read(frames)
+        depths.append(playback.depth())
+        t += period
+    return np.array(depths[len(depths) // 10:]), np.array(write_times)
+
+
+def bench_playback(args):
+    chunks = make_chunks(args.seconds, args.samples_per_sec, 16, args.package_size)
+    print("%.0f s, jitter %.0f ms, %.0f ms stall every %.0f s, device clock %+.2f%%" % (
+        args.seconds, args.jitter, args.stall, args.stall_interval, args.drift
+    ))
+    for name, max_latency, policy in (
+        ("unbounded", args.seconds * 1000, "drop"),
+        ("drop", args.max_latency, "drop"),
+        ("stretch", args.max_latency, "stretch")
+    ):
+        playback = Playback(args.samples_per_sec, 16, args.target_latency, max_latency, policy)
+        depths, write_times = simulate_playback(
+            playback, chunks, args.samples_per_sec, args.jitter, args.stall_interval, args.stall, args.drift
+        )
+        print("%-10s latency mean %.0f ms, p99 %.0f ms, max %.0f ms, %d underruns, %.2f s dropped, %.2f s stretched, write mean %.1f us, max %.1f us" % (
+            name, depths.mean(), np.percentile(depths, 99), depths.max(), playback.underruns,
+            playback.dropped / args.samples_per_sec, playback.stretched / args.samples_per_sec,
+            write_times.mean() * 1e6, write_times.max() * 1e6
+        ))
+
+
+STARTUP = """
+import time
+t0 = time.perf_counter()
+import %s
+t = time.perf_counter() - t0
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:
+    rss = float("nan")
+print(t, rss)
+"""
+
+
+def bench_startup(args):
+    print("imports                                                 time p50 [ms]  peak RSS [MB]")
+    for modules in args.imports:
+        results = []
+        for _ in range(args.runs):
+            output = subprocess.check_output(
+                [sys.executable, "-c", STARTUP % modules],
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            results.append([float(x) for x in output.split()])
+        t, rss = np.median(results, axis=0)
+        print("%-54s  %13.1f  %13.1f" % (modules, t * 1000, rss))
+
+
+def count_handles():
+    return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else -1
+
+
+def bench_play_toggle(args):
+    import pyaudio
+
+    def fresh():
+        # what start_play used to do: a new PortAudio instance per toggle that is never terminated
+        stream = pyaudio.PyAudio().open(format=pyaudio.paInt16, channels=1, rate=args.samples_per_sec, output=True)
+        return stream.close
+
+    def pooled():
+        out = Playback(args.samples_per_sec, 16)
+        out.start()
+        return out.close
+
+    print("%d start/stop toggles" % args.toggles)
+    for name, start in (("fresh", fresh), ("pooled", pooled)):
+        start()()
+        tracemalloc.start()
+        handles = count_handles()
+        opened = playback.backend.opened
+        times = []
+        for _ in range(args.toggles):
+            t0 = time.perf_counter()
+            stop = start()
+            times.append(time.perf_counter() - t0)
+            stop()
+        del stop
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        times = np.array(times) * 1000
+        print("%-7s start mean %.3f ms, p99 %.3f ms, max %.3f ms, %+d handles, %+.1f KB Python memory, %d streams opened" % (
+            name, times.mean(), np.percentile(times, 99), times.max(),
+            count_handles() - handles, memory / 1024,
+            playback.backend.opened - opened if name == "pooled" else args.toggles
+        ))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("decode", help="per-sample vs vectorized decoding and envelope")
+    p.add_argument("--seconds", type=float, default=10)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--bits-per-sample", type=int, default=16, choices=[8, 16])
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--volume-T", type=int, default=10)
+    p.add_argument("--volume-K", type=float, default=0.1)
+    p.set_defaults(func=bench_decode)
+
+    p = subparsers.add_parser("buffers", help="deque vs ring buffer memory and snapshot cost")
+    p.add_argument("--viewport-size", type=int, default=20000)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--repeat", type=int, default=10)
+    p.set_defaults(func=bench_buffers)
+
+    p = subparsers.add_parser("handoff", help="receiver publish latency while redraws are slow")
+    p.add_argument("--seconds", type=float, default=5)
+    p.add_argument("--viewport-size", type=int, default=20000)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--redraw", type=float, default=200, help="simulated redraw time [ms]")
+    p.set_defaults(func=bench_handoff)
+
+    p = subparsers.add_parser("render", help="full vs min/max decimated vs blitted redraw time")
+    p.add_argument("--viewport-sizes", type=int, nargs="+", default=[5000, 20000, 100000])
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--width", type=int, default=600, help="canvas width [px]")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_render)
+
+    p = subparsers.add_parser("responsiveness", help="GUI event loop latency with scope and spectrum drawn on the GUI thread vs render workers")
+    p.add_argument("--seconds", type=float, default=5)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--viewport-size", type=int, default=100000, help="[ms], the largest the GUI allows")
+    p.add_argument("--interval", type=int, default=10, help="[ms], the shortest the GUI allows")
+    p.add_argument("--probe", type=int, default=5, help="[ms]")
+    p.set_defaults(func=bench_responsiveness)
+
+    p = subparsers.add_parser("stream", help="AcPlayer against the fake transmitter: throughput, CPU, latency")
+    p.add_argument("--package-sizes", type=int, nargs="+", default=[1024, 4096, 16384])
+    p.add_argument("--samples-per-sec", type=int, nargs="+", default=[8000, 44100])
+    p.add_argument("--bits-per-sample", type=int, nargs="+", default=[8, 16])
+    p.add_argument("--chunk-size", type=int, default=4096, help="transmitter chunk size [B]")
+    p.add_argument("--burst", type=int, default=1, help="transmitter chunks per burst")
+    p.add_argument("--speed", type=float, default=1, help="transmitter speed for the latency run")
+    p.add_argument("--seconds", type=float, default=3)
+    p.add_argument("--warmup", type=float, default=0.5)
+    p.add_argument("--late-threshold", type=float, default=100, help="[ms]")
+    p.add_argument("--headless", action="store_true", help="without the scope and spectrum stages")
+    p.set_defaults(func=bench_stream)
+
+    p = subparsers.add_parser("reconnect", help="recording continuity while the transmitter keeps dropping the connection")
+    p.add_argument("--seconds", type=float, default=20)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--disconnect-after", type=float, default=3)
+    p.add_argument("--stall", type=float, default=1)
+    p.add_argument("--timeout", type=int, default=500, help="[ms]")
+    p.add_argument("--max-backoff", type=float, default=30)
+    p.add_argument("--max-gap-fill", type=float, default=60)
+    p.set_defaults(func=bench_reconnect)
+
+    p = subparsers.add_parser("relay", help="many receivers straight from the transmitter vs through relay.py")
+    p.add_argument("--clients", type=int, default=30)
+    p.add_argument("--slow", type=int, default=2, help="receivers that never read")
+    p.add_argument("--samples-per-sec", type=int, default=48000)
+    p.add_argument("--max-buffer", type=int, default=256 * 1024)
+    p.add_argument("--seconds", type=float, default=5)
+    p.set_defaults(func=bench_relay)
+
+    p = subparsers.add_parser("wav", help="per-packet file writes vs buffered WavWriter")
+    p.add_argument("--seconds", type=float, default=600)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--block-size", type=int, default=64 * 1024)
+    p.add_argument("--header-interval", type=float, default=5)
+    p.add_argument("--disk-latency", type=float, default=0, help="simulated latency per write syscall [ms]")
+    p.set_defaults(func=bench_wav)
+
+    p = subparsers.add_parser("meters", help="meter bank cost per number of meters vs one pass per meter")
+    p.add_argument("--seconds", type=float, default=300)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--volume-T", type=int, default=10)
+    p.add_argument("--volume-K", type=float, default=0.1)
+    p.add_argument("--counts", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    p.set_defaults(func=bench_meters)
+
+    p = subparsers.add_parser("compression", help="segmented recording: gzip ratio and encoder cost per level and signal")
+    p.add_argument("--seconds", type=float, default=120)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--segment-seconds", type=float, default=60)
+    p.add_argument("--speed", type=float, default=20)
+    p.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    p.set_defaults(func=bench_compression)
+
+    p = subparsers.add_parser("volume-log", help="text vs binary volume log cost and size")
+    p.add_argument("--seconds", type=float, default=600)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--volume-T", type=int, default=1)
+    p.add_argument("--volume-K", type=float, default=0.1)
+    p.set_defaults(func=bench_volume_log)
+
+    p = subparsers.add_parser("analyze", help="offline archive analysis throughput per worker count")
+    p.add_argument("--files", type=int, default=16)
+    p.add_argument("--seconds", type=float, default=120)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.set_defaults(func=bench_analyze)
+
+    p = subparsers.add_parser("playback", help="jitter buffer latency and underruns under network jitter, stalls and clock drift")
+    p.add_argument("--seconds", type=float, default=300)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--target-latency", type=int, default=100, help="[ms]")
+    p.add_argument("--max-latency", type=int, default=500, help="[ms]")
+    p.add_argument("--jitter", type=float, default=20, help="mean network delay [ms]")
+    p.add_argument("--stall", type=float, default=300, help="[ms]")
+    p.add_argument("--stall-interval", type=float, default=30, help="[s], 0 for none")
+    p.add_argument("--drift", type=float, default=0.5, help="device clock offset [%%]")
+    p.set_defaults(func=bench_playback)
+
+    p = subparsers.add_parser("play-toggle", help="start/stop playback latency and resource growth")
+    p.add_argument("--toggles", type=int, default=2000)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.set_defaults(func=bench_play_toggle)
+
+    p = subparsers.add_parser("receive", help="bytes concatenation vs recv_into receive loop: throughput and allocations")
+    p.add_argument("--seconds", type=float, default=60)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.set_defaults(func=bench_receive)
+
+    p = subparsers.add_parser("pipeline", help="inline sinks vs queued stages with a stalling analyzer")
+    p.add_argument("--seconds", type=float, default=10)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--stall", type=float, default=250, help="[ms]")
+    p.add_argument("--stall-interval", type=float, default=2, help="[s]")
+    p.set_defaults(func=bench_pipeline)
+
+    p = subparsers.add_parser("metrics", help="AcPlayer replay cost with metrics disabled vs enabled")
+    p.add_argument("--seconds", type=float, default=120)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_metrics)
+
+    p = subparsers.add_parser("spectrum", help="per-frame vs batched FFT spectrogram cost")
+    p.add_argument("--seconds", type=float, default=60)
+    p.add_argument("--samples-per-sec", type=int, default=48000)
+    p.add_argument("--package-sizes", type=int, nargs="+", default=[1024, 4096, 65536])
+    p.add_argument("--fft-size", type=int, default=1024)
+    p.add_argument("--hop", type=int, default=512)
+    p.set_defaults(func=bench_spectrum)
+
+    p = subparsers.add_parser("trigger", help="threshold-triggered vs continuous recording size")
+    p.add_argument("--seconds", type=float, default=3600)
+    p.add_argument("--samples-per-sec", type=int, default=44100)
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--events", type=int, default=20)
+    p.add_argument("--noise", type=float, default=100)
+    p.add_argument("--attack", type=float, default=2000)
+    p.add_argument("--release", type=float, default=1000)
+    p.add_argument("--pre-roll", type=float, default=5)
+    p.add_argument("--hold", type=float, default=2)
+    p.add_argument("--volume-T", type=int, default=10)
+    p.add_argument("--volume-K", type=float, default=0.1)
+    p.set_defaults(func=bench_trigger)
+
+    p = subparsers.add_parser("startup", help="import time and peak RSS of the headless and the old eager imports")
+    p.add_argument("--imports", nargs="+", default=[
+        "numpy", "core", "core, matplotlib.pyplot, matplotlib.animation, pyaudio"
+    ])
+    p.add_argument("--runs", type=int, default=5)
+    p.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
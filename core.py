@@ -1,108 +1,196 @@
+import argparse
+import logging
+import signal
+import sys
 import socket
 import select
 import hashlib
-from threading import Lock, Thread
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-import pyaudio
+from threading import Event, Lock, Thread
 import time
-from datetime import datetime
 import os
-from collections import deque
-
-
-def write_wav_header(f, samples_per_sec, channels, bits_per_sample):
-    """
-    DWORD rId; //"RIFF" = 0x46464952
-    DWORD rLen; //36 + dLen
-    DWORD wId; //"WAVE" = 0x45564157
-    DWORD fId; //"fmt " = 0x20746D66
-    DWORD fLen; //16
-    WORD wFormatTag; //1 (WAVE_FORMAT_PCM)
-    WORD nChannels;
-    DWORD nSamplesPerSec;
-    DWORD nAvgBytesPerSec;
-    WORD nBlockAlign;
-    WORD wBitsPerSample;
-    DWORD dId; //"data" = 0x61746164
-    DWORD dLen;
-    """
-
-    data = (
-        int(0x46464952).to_bytes(4, "little") +
-        int(36).to_bytes(4, "little") +
-        int(0x45564157).to_bytes(4, "little") +
-        int(0x20746D66).to_bytes(4, "little") +
-        int(16).to_bytes(4, "little") +
-        int(1).to_bytes(2, "little") +
-        int(channels).to_bytes(2, "little") +
-        int(samples_per_sec).to_bytes(4, "little") +
-        int(samples_per_sec * channels * bits_per_sample / 8).to_bytes(4, "little") +
-        int(channels * bits_per_sample / 8).to_bytes(2, "little") +
-        int(bits_per_sample).to_bytes(2, "little") +
-        int(0x61746164).to_bytes(4, "little") +
-        int(0).to_bytes(4, "little")
-    )
-
-    f.write(data)
-
-
-def fix_wav_header(f, recorded):
-    f.seek(4)
-    f.write(int(36 + recorded).to_bytes(4, "little"))
-
-    f.seek(40)
-    f.write(int(recorded).to_bytes(4, "little"))
-
-
-def send_play_cmd(s, password, samples_per_sec, bits_per_sample):
+import numpy as np
+import metrics
+from scope import Scope
+from spectrum import Spectrogram
+from wav_reader import WavReader
+from volume_log import VolumeLogWriter, TextVolumeLogWriter
+from meters import DEFAULT_METERS, MeterBank, format_levels
+from session_index import SessionIndex
+from playback import Playback
+from trigger import TriggeredRecorder
+from segments import SegmentedRecorder
+from pipeline import Chunk, Gap, Stage, Pipeline
+
+
+def make_play_cmd(password, samples_per_sec, bits_per_sample):
     p = hashlib.md5(password.encode("utf-8")).hexdigest().encode("utf-8")
-    data = (
+    return (
         int(3).to_bytes(1, "little") +
         len(p).to_bytes(4, "little") +
         p +
         int(samples_per_sec).to_bytes(4, "little") +
         int(bits_per_sample).to_bytes(4, "little")
     )
-    s.send(data)
+
+
+def send_play_cmd(s, password, samples_per_sec, bits_per_sample):
+    s.send(make_play_cmd(password, samples_per_sec, bits_per_sample))
     data = s.recv(1)
     if data != b"\x01":
         raise RuntimeError("send_play_cmd: unexpected response: %s" % data)
 
 
+def receive(s, package_size, bytes_per_sample, timeout, process, metrics=None, max_idle=None):
+    # one buffer for the whole session: process() gets a memoryview that is only valid until it returns
+    buffer = bytearray(package_size + bytes_per_sample)
+    view = memoryview(buffer)
+    rem = 0
+    idle = 0
+    while True:
+        sockets = [s]
+        rlist, _, xlist = select.select(sockets, [], sockets, timeout)
+        if xlist:
+            break
+        if rlist:
+            n = s.recv_into(view[rem:rem + package_size])
+            if n == 0:
+                break
+            idle = 0
+
+            n += rem
+            rem = n % bytes_per_sample
+            if n > rem:
+                process(view[:n - rem])
+            if rem:
+                view[:rem] = view[n - rem:n]
+        else:
+            metrics and metrics.add("select_timeouts")
+            idle += timeout
+            if max_idle is not None and idle >= max_idle:
+                raise TimeoutError("receive: no data for %.1f s" % idle)
+
+
+def decode_samples(data, bits_per_sample):
+    return np.frombuffer(data, dtype=np.int8 if bits_per_sample == 8 else "<i2")
+
+
+class VolumeEnvelope:
+    def __init__(self, volume_N, volume_K):
+        self.__N = max(volume_N, 1)
+        self.__K = volume_K
+        self.max_amplitude = 0
+        self.count_of_amplitudes = 0
+        self.volume = 0
+
+    def process(self, values):
+        n = len(values)
+        amplitudes = np.abs(values.astype(np.int32))
+
+        ends = np.arange(self.__N - self.count_of_amplitudes - 1, n, self.__N)
+        if len(ends) == 0:
+            if n:
+                self.max_amplitude = max(self.max_amplitude, int(amplitudes.max()))
+                self.count_of_amplitudes += n
+            return np.full(n, self.volume, dtype=np.float64), []
+
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        block_max = np.maximum.reduceat(amplitudes[:ends[-1] + 1], starts).tolist()
+        block_max[0] = max(block_max[0], self.max_amplitude)
+
+        block_volumes = []
+        volume = self.volume
+        for max_amplitude in block_max:
+            volume += (max_amplitude - volume) * self.__K
+            block_volumes.append(volume)
+
+        volumes = np.repeat([self.volume] + block_volumes, np.diff(np.concatenate(([0], ends, [n]))))
+
+        tail = amplitudes[ends[-1] + 1:]
+        self.max_amplitude = int(tail.max()) if len(tail) else 0
+        self.count_of_amplitudes = len(tail)
+        self.volume = volume
+
+        return volumes, block_volumes
+
+
 class AcPlayer:
-    def __init__(self):
+    def __init__(self, metrics=None, analyze=True, meters=DEFAULT_METERS):
         if not os.path.exists("data"):
             os.mkdir("data")
 
         self.__s = None
+        self.__online = False
+        self.__connect_stop = Event()
+        self.__reconnects = 0
+        self.__downtime = 0
+        self.__last_data_time = 0
+        self.__reader = None
+        self.__replay_stop = Event()
         self.__thread = None
         self.__received = 0
+        self.__samples_per_sec = 0
+        self.__bits_per_sample = 16
+
+        self.metrics = metrics
+        self.analyze = analyze
+        self.pipeline = Pipeline()
 
-        self.__out_mutex = Lock()
+        self.__out_mutex = metrics.lock("out_mutex", Lock()) if metrics else Lock()
         self.__out = None
+        self.__out_stage = None
 
-        self.__f_mutex = Lock()
+        self.__f_mutex = metrics.lock("f_mutex", Lock()) if metrics else Lock()
         self.__f = None
+        self.__f_stage = None
         self.__recorded = 0
+        self.__index = None
 
-        self.__f_volume_mutex = Lock()
+        self.__f_volume_mutex = metrics.lock("f_volume_mutex", Lock()) if metrics else Lock()
         self.__f_volume = None
+        self.__f_volume_stage = None
         self.__recorded_volume_samples = 0
 
-        self.__max_amplitude = 0
-        self.__count_of_amplitudes = 0
-        self.__volume = 0
+        self.__envelope = VolumeEnvelope(0, 0)
+        self.__meters = meters
+        self.meter_bank = MeterBank(0, 16, meters)
 
-        self.buffer_mutex = Lock()
-        self.buffer_size = 0
-        self.values = []
-        self.volumes = []
+        self.scope = Scope(0)
+        self.__scope_stage = None
+        self.spectrogram = Spectrogram(0)
+        self.__spectrum_stage = None
 
         self.on_change = None
+        self.on_data = None
+
+        if metrics:
+            for name in ("depth", "max_depth", "dropped", "coalesced", "blocked_time", "latency_mean", "latency_max"):
+                metrics.gauge(
+                    "stage_" + name,
+                    lambda name=name: {stat["name"]: stat[name] for stat in self.pipeline.stats()},
+                    "stage"
+                )
+            for name in ("depth", "underruns", "dropped"):
+                metrics.gauge(
+                    "playback_" + name,
+                    lambda name=name: (self.playback_stat() or {}).get(name, 0)
+                )
+            metrics.gauge("record_dropped_bytes", self.dropped)
+            metrics.gauge("online", lambda: int(self.online()))
 
     def connected(self):
-        return self.__s is not None
+        return self.__s is not None or self.__reader is not None
+
+    def online(self):
+        return self.__online or self.__reader is not None
+
+    def reconnects(self):
+        return self.__reconnects
+
+    def downtime(self):
+        return self.__downtime
+
+    def replaying(self):
+        return self.__reader is not None
 
     def playing(self):
         return self.__out is not None
@@ -110,6 +198,17 @@ class AcPlayer:
     def recording(self):
         return self.__f is not None
 
+    def triggering(self):
+        return isinstance(self.__f, TriggeredRecorder)
+
+    def triggered(self):
+        f = self.__f
+        return isinstance(f, TriggeredRecorder) and f.triggered()
+
+    def events(self):
+        f = self.__f
+        return f.events if isinstance(f, TriggeredRecorder) else 0
+
     def recording_volume(self):
         return self.__f_volume is not None
 
@@ -119,36 +218,83 @@ class AcPlayer:
     def recorded(self):
         return self.__recorded
 
+    def stored(self):
+        f = self.__f
+        return f.stored() if f is not None else 0
+
+    def dropped(self):
+        f = self.__f
+        return f.dropped() if f is not None else 0
+
     def recorded_volume_samples(self):
         return self.__recorded_volume_samples
 
     def volume(self):
-        return self.__volume
+        return self.__envelope.volume
 
-    def connect(
-        self,
-        address, port, package_size, timeout, password,
-        samples_per_sec, bits_per_sample, volume_T, volume_K,
-        viewport_size
-    ):
+    def levels(self):
+        return self.meter_bank.levels()
+
+    def clips(self):
+        return self.meter_bank.clips
+
+    def samples_per_sec(self):
+        return self.__samples_per_sec
+
+    def bits_per_sample(self):
+        return self.__bits_per_sample
+
+    def __init_session(self, package_size, samples_per_sec, bits_per_sample, volume_T, volume_K, viewport_size):
         self.__package_size = package_size
-        self.__timeout = timeout
         self.__samples_per_sec = samples_per_sec
         self.__bits_per_sample = bits_per_sample
-        self.__volume_N = int(samples_per_sec * volume_T / 100)
-        self.__volume_K = volume_K
 
         self.__received = 0
         self.__recorded = 0
         self.__recorded_volume_samples = 0
-        self.__max_amplitude = 0
-        self.__count_of_amplitudes = 0
-        self.__volume = 0
+        self.__envelope = VolumeEnvelope(int(samples_per_sec * volume_T / 100), volume_K)
+        self.meter_bank = MeterBank(int(samples_per_sec * volume_T / 100), bits_per_sample, self.__meters, samples_per_sec)
+
+        if not self.analyze:
+            return
+        self.scope = Scope(int(viewport_size * samples_per_sec / 1000), np.int8 if bits_per_sample == 8 else np.int16)
+        scope = self.scope
+        self.__scope_stage = self.pipeline.add(Stage(
+            "scope", lambda chunk: scope.publish(chunk.values, chunk.volumes), "coalesce", 4
+        ))
+        self.spectrogram = Spectrogram(samples_per_sec, amplitude=128 if bits_per_sample == 8 else 32768)
+        spectrogram = self.spectrogram
+        self.__spectrum_stage = self.pipeline.add(Stage(
+            "spectrum", lambda chunk: spectrogram.process(chunk.values), "coalesce", 4
+        ))
+
+    def __end_session(self):
+        self.stop_play()
+        self.stop_record()
+        self.stop_record_volume()
+        if self.__scope_stage is not None:
+            self.pipeline.remove(self.__scope_stage)
+            self.__scope_stage = None
+        if self.__spectrum_stage is not None:
+            self.pipeline.remove(self.__spectrum_stage)
+            self.__spectrum_stage = None
 
-        with self.buffer_mutex:
-            self.buffer_size = int(viewport_size * samples_per_sec / 1000)
-            self.values = deque([0 for _ in range(self.buffer_size)], maxlen=self.buffer_size)
-            self.volumes = deque([0 for _ in range(self.buffer_size)], maxlen=self.buffer_size)
+    def connect(
+        self,
+        address, port, package_size, timeout, password,
+        samples_per_sec, bits_per_sample, volume_T, volume_K,
+        viewport_size, reconnect=False, max_backoff=30
+    ):
+        self.__address = address
+        self.__port = port
+        self.__timeout = timeout
+        self.__password = password
+        self.__reconnect = reconnect
+        self.__max_backoff = max_backoff
+        self.__reconnects = 0
+        self.__downtime = 0
+        self.__connect_stop.clear()
+        self.__init_session(package_size, samples_per_sec, bits_per_sample, volume_T, volume_K, viewport_size)
 
         try:
             self.__s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -162,13 +308,34 @@ class AcPlayer:
             except:
                 pass
             self.__s = None
+            self.__end_session()
             self.on_change and self.on_change()
             raise
+        self.__online = True
+        self.__last_data_time = time.time()
 
         self.__thread = Thread(target=self.__target)
         self.__thread.start()
 
+    def replay(self, filename, package_size, speed, volume_T, volume_K, viewport_size):
+        self.__reader = WavReader(filename)
+        self.__init_session(
+            package_size, self.__reader.samples_per_sec, self.__reader.bits_per_sample,
+            volume_T, volume_K, viewport_size
+        )
+        self.__replay_speed = speed
+        self.__replay_stop.clear()
+        self.on_change and self.on_change()
+
+        self.__thread = Thread(target=self.__replay_target)
+        self.__thread.start()
+
     def disconnect(self):
+        if self.__reader is not None:
+            self.__replay_stop.set()
+            self.__thread.join()
+            return
+        self.__connect_stop.set()
         try:
             self.__s.close()
         except:
@@ -177,40 +344,84 @@ class AcPlayer:
         self.__s = None
         self.on_change and self.on_change()
 
-    def start_play(self):
+    def close(self):
+        if self.connected():
+            self.disconnect()
+        if self.__index is not None:
+            self.__index.close()
+            self.__index = None
+
+    def playback_stat(self):
+        with self.__out_mutex:
+            return self.__out.stat() if self.__out is not None else None
+
+    def start_play(self, target_latency=100, max_latency=500, policy="stretch"):
         with self.__out_mutex:
             try:
-                self.__out = pyaudio.PyAudio().open(
-                    format=pyaudio.paInt8 if self.__bits_per_sample == 8 else pyaudio.paInt16,
-                    channels=1,
-                    rate=self.__samples_per_sec,
-                    output=True
+                self.__out = Playback(
+                    self.__samples_per_sec, self.__bits_per_sample,
+                    target_latency=target_latency, max_latency=max_latency, policy=policy
                 )
+                self.__out.start()
+                out = self.__out
+                self.__out_stage = self.pipeline.add(Stage(
+                    "play", lambda chunk: out.write(chunk.data), "drop-oldest", on_error=self.__play_error
+                ))
                 self.on_change and self.on_change()
             except:
+                try:
+                    self.__out.close()
+                except:
+                    pass
                 self.__out = None
                 self.on_change and self.on_change()
                 raise
 
     def stop_play(self):
         with self.__out_mutex:
-            if self.__out is not None:
-                try:
-                    self.__out.close()
-                    self.__out = None
-                    self.on_change and self.on_change()
-                except:
-                    self.__out = None
-                    self.on_change and self.on_change()
-                    raise
+            out = self.__out
+            self.__out = None
+            stage = self.__out_stage
+            self.__out_stage = None
+        if stage is not None:
+            self.pipeline.remove(stage)
+        if out is not None:
+            try:
+                out.close()
+            finally:
+                self.on_change and self.on_change()
+
+    def __play_error(self, e):
+        print("AcPlayer.__play_error: player error: %s" % e)
+        self.stop_play()
 
-    def start_record(self):
+    def start_record(
+        self, header_interval=5, max_gap_fill=60, attack=None, release=None, pre_roll=5, hold=2,
+        segment_seconds=None, segment_size=None, compression=None
+    ):
         with self.__f_mutex:
             try:
                 self.__recorded = 0
-                self.__f = open(time.strftime("data/%Y-%m-%d %H-%M-%S.wav"), "w+b")
+                if self.__index is None:
+                    self.__index = SessionIndex()
+                if attack is not None:
+                    self.__f = TriggeredRecorder(
+                        self.__samples_per_sec, self.__bits_per_sample,
+                        attack, attack if release is None else release, pre_roll, hold,
+                        index=self.__index, header_interval=header_interval, compression=compression
+                    )
+                else:
+                    self.__f = SegmentedRecorder(
+                        self.__samples_per_sec, self.__bits_per_sample, segment_seconds, segment_size,
+                        compression=compression, index=self.__index, header_interval=header_interval,
+                        max_gap_fill=max_gap_fill
+                    )
+                f = self.__f
+                self.__f_stage = self.pipeline.add(Stage(
+                    "record", lambda chunk: self.__record(f, chunk), "block", 256,
+                    on_error=self.__record_error
+                ))
                 self.on_change and self.on_change()
-                write_wav_header(self.__f, self.__samples_per_sec, 1, self.__bits_per_sample)
             except:
                 try:
                     self.__f.close()
@@ -222,26 +433,46 @@ class AcPlayer:
 
     def stop_record(self):
         with self.__f_mutex:
-            if self.__f is not None:
-                try:
-                    fix_wav_header(self.__f, self.__recorded)
-                    self.__f.close()
-                    self.__f = None
-                    self.on_change and self.on_change()
-                except:
-                    try:
-                        self.__f.close()
-                    except:
-                        pass
-                    self.__f = None
-                    self.on_change and self.on_change()
-                    raise
-
-    def start_record_volume(self):
+            f = self.__f
+            self.__f = None
+            stage = self.__f_stage
+            self.__f_stage = None
+        if stage is not None:
+            self.pipeline.remove(stage)
+        if f is not None:
+            try:
+                f.close()
+            finally:
+                self.on_change and self.on_change()
+
+    def __record(self, f, chunk):
+        recorded = f.recorded
+        if isinstance(chunk, Gap):
+            f.gap(chunk.start, chunk.end)
+        else:
+            f.process(chunk.values, chunk.volumes, chunk.timestamp_ns)
+        self.__recorded += f.recorded - recorded
+
+    def __record_error(self, e):
+        print("AcPlayer.__record_error: recorder error: %s" % e)
+        self.stop_record()
+
+    def start_record_volume(self, binary=True, log_meters=False):
         with self.__f_volume_mutex:
             try:
                 self.__recorded_volume_samples = 0
-                self.__f_volume = open(time.strftime("data/%Y-%m-%d %H-%M-%S.txt"), "w")
+                # meter columns triple the size of a binary record, both formats keep them opt-in
+                meters = self.meter_bank.names if log_meters else ()
+                if binary:
+                    self.__f_volume = VolumeLogWriter(time.strftime("data/%Y-%m-%d %H-%M-%S.vol"), meters=meters)
+                else:
+                    self.__f_volume = TextVolumeLogWriter(time.strftime("data/%Y-%m-%d %H-%M-%S.txt"), meters=meters)
+                f_volume = self.__f_volume
+                # a lost chunk only leaves a hole in the log, ingest never waits for its disk writes
+                self.__f_volume_stage = self.pipeline.add(Stage(
+                    "volume-log", lambda chunk: self.__record_volume(f_volume, chunk), "drop-oldest", 256,
+                    on_error=self.__record_volume_error
+                ))
                 self.on_change and self.on_change()
             except:
                 try:
@@ -254,201 +485,277 @@ class AcPlayer:
 
     def stop_record_volume(self):
         with self.__f_volume_mutex:
-            if self.__f_volume is not None:
-                try:
-                    self.__f_volume.close()
-                    self.__f_volume = None
-                    self.on_change and self.on_change()
-                except:
-                    try:
-                        self.__f_volume.close()
-                    except:
-                        pass
-                    self.__f_volume = None
-                    self.on_change and self.on_change()
-                    raise
+            f_volume = self.__f_volume
+            self.__f_volume = None
+            stage = self.__f_volume_stage
+            self.__f_volume_stage = None
+        if stage is not None:
+            self.pipeline.remove(stage)
+        if f_volume is not None:
+            try:
+                f_volume.close()
+            finally:
+                self.on_change and self.on_change()
 
-    def __target(self):
-        try:
-            timeout = self.__timeout / 1000
-            bytes_per_sample = int(self.__bits_per_sample / 8)
-            rem = b""
-            while True:
-                sockets = [self.__s]
-                rlist, _, xlist = select.select(sockets, [], sockets, timeout)
-                if xlist:
-                    break
-                if rlist:
-                    data = rem + self.__s.recv(self.__package_size)
+    def __record_volume(self, f_volume, chunk):
+        if chunk.block_volumes:
+            f_volume.append(chunk.timestamp_ns, chunk.block_volumes, chunk.meters)
+            self.__recorded_volume_samples += len(chunk.block_volumes)
 
-                    n = len(data)
-                    if n == 0:
-                        break
+    def __record_volume_error(self, e):
+        print("AcPlayer.__record_volume_error: volume recorder error: %s" % e)
+        self.stop_record_volume()
 
-                    if n % 2 == 1:
-                        rem = data[-1:]
-                        data = data[:-1]
-                        n -= 1
-                    else:
-                        rem = b""
-
-                    self.__received += n
-
-                    with self.__out_mutex:
-                        if self.__out is not None:
-                            try:
-                                self.__out.write(data)
-                            except Exception as e:
-                                print("AcPlayer.__target: player error: %s" % e)
-                                try:
-                                    self.__out.close()
-                                except:
-                                    pass
-                                self.__out = None
-                                self.on_change and self.on_change()
-
-                    with self.__f_mutex:
-                        if self.__f is not None:
-                            try:
-                                self.__f.write(data)
-                                self.__recorded += n
-                            except Exception as e:
-                                print("AcPlayer.__target: recorder error: %s" % e)
-                                try:
-                                    self.__f.close()
-                                except:
-                                    pass
-                                self.__f = None
-                                self.on_change and self.on_change()
-
-                    with self.buffer_mutex:
-                        i = 0
-                        while i < n:
-                            value = int.from_bytes(data[i:i + bytes_per_sample], "little", signed=True)
-                            self.values.append(value)
-
-                            amplitude = abs(value)
-                            if amplitude > self.__max_amplitude:
-                                self.__max_amplitude = amplitude
-                            self.__count_of_amplitudes += 1
-                            if self.__count_of_amplitudes >= self.__volume_N:
-                                self.__volume += (self.__max_amplitude - self.__volume) * self.__volume_K
-                                with self.__f_volume_mutex:
-                                    if self.__f_volume is not None:
-                                        try:
-                                            self.__f_volume.write("{}\t{:.2f}\n".format(datetime.now().strftime("%Y.%m.%d %H:%M:%S.%f"), self.__volume))
-                                            self.__recorded_volume_samples += 1
-                                        except Exception as e:
-                                            print("AcPlayer.__target: volume recorder error: %s" % e)
-                                            try:
-                                                self.__f_volume.close()
-                                            except:
-                                                pass
-                                            self.__f_volume = None
-                                            self.on_change and self.on_change()
-                                self.__max_amplitude = 0
-                                self.__count_of_amplitudes = 0
-                            self.volumes.append(self.__volume)
-
-                            i += bytes_per_sample
-        except Exception as e:
-            print("AcPlayer.__target: %s" % e)
+    def __process(self, data):
+        metrics = self.metrics
+        if metrics:
+            t0 = time.perf_counter()
+        self.__received += len(data)
+        self.__last_data_time = time.time()
+
+        # the stages run behind queues while the receive buffer is reused
+        data = bytes(data)
+        values = decode_samples(data, self.__bits_per_sample)
+        volumes, block_volumes = self.__envelope.process(values)
+        meters = self.meter_bank.process(values)
+
+        self.pipeline.publish(Chunk(data, values, volumes, block_volumes, time.monotonic_ns(), meters))
+        self.on_data and self.on_data(values)
+
+        if metrics:
+            metrics.observe("process_seconds", time.perf_counter() - t0)
+            metrics.add("received_bytes", len(data))
+            metrics.add("received_samples", len(values))
+            metrics.add("packets")
+
+    def __open(self):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.settimeout(self.__timeout / 1000)
+            s.connect((self.__address, self.__port))
+            send_play_cmd(s, self.__password, self.__samples_per_sec, self.__bits_per_sample)
+        except:
+            s.close()
+            raise
+        return s
+
+    def __target(self):
+        backoff = 0.5
+        while True:
+            received = self.__received
+            try:
+                receive(
+                    self.__s, self.__package_size, self.__bits_per_sample // 8, self.__timeout / 1000,
+                    self.__process, self.metrics, self.__timeout / 1000 if self.__reconnect else None
+                )
+                error = None
+            except Exception as e:
+                error = e
+            if not self.__reconnect or self.__connect_stop.is_set():
+                if error is not None:
+                    print("AcPlayer.__target: %s" % error)
+                break
+
+            print("AcPlayer.__target: %s, reconnecting" % (error or "connection closed"))
+            try:
+                self.__s.close()
+            except:
+                pass
+            self.__online = False
+            self.on_change and self.on_change()
+            if self.__received > received:
+                backoff = 0.5
+            while not self.__connect_stop.wait(backoff):
+                backoff = min(backoff * 2, self.__max_backoff)
+                try:
+                    self.__s = self.__open()
+                    break
+                except Exception as e:
+                    print("AcPlayer.__target: reconnect failed: %s" % e)
+            if self.__connect_stop.is_set():
+                break
+
+            gap = Gap(self.__last_data_time, time.time())
+            self.__reconnects += 1
+            self.__downtime += gap.end - gap.start
+            if self.metrics:
+                self.metrics.add("reconnects")
+                self.metrics.add("downtime_seconds", gap.end - gap.start)
+            print("AcPlayer.__target: reconnected after %.1f s" % (gap.end - gap.start))
+            with self.__f_mutex:
+                stage = self.__f_stage
+            if stage is not None:
+                stage.put(gap, time.perf_counter())
+            self.__online = True
+            self.on_change and self.on_change()
         try:
             self.__s.close()
         except:
             pass
         self.__s = None
+        self.__online = False
         self.on_change and self.on_change()
-        self.stop_play()
-        self.stop_record()
-        self.stop_record_volume()
-
+        self.__end_session()
 
-if __name__ == "__main__":
-    start_play = True
-    start_record = True
-    start_record_volume = True
-    start_draw = True
-
-    address = "127.0.0.1"
-    port = 9000
-    package_size = 4096
-    timeout = 5000
-    password = "0000"
-
-    samples_per_sec = 44100
-    bits_per_sample = 16
-    volume_T = 10
-    volume_K = 0.1
+    def __replay_target(self):
+        try:
+            package_samples = max(self.__package_size * 8 // self.__bits_per_sample, 1)
+            start = time.monotonic()
+            i = 0
+            for values in self.__reader.chunks(package_samples):
+                if self.__replay_speed > 0:
+                    delay = start + i / self.__samples_per_sec / self.__replay_speed - time.monotonic()
+                    if self.__replay_stop.wait(max(delay, 0)):
+                        break
+                elif self.__replay_stop.is_set():
+                    break
+                self.__process(values.tobytes())
+                i += len(values)
+        except Exception as e:
+            print("AcPlayer.__replay_target: %s" % e)
+        try:
+            self.__reader.close()
+        except:
+            pass
+        self.__reader = None
+        self.on_change and self.on_change()
+        self.__end_session()
+
+
+def draw(ac_player, viewport_size, viewport_interval):
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    fig, ax = plt.subplots()
+
+    ax.set_xlim([0, viewport_size])
+    amplitude = 128 if ac_player.bits_per_sample() == 8 else 32768
+    ax.set_ylim([-amplitude, amplitude])
+
+    _, values, volumes = ac_player.scope.read()
+    t = np.arange(ac_player.scope.size) * (viewport_size / ac_player.scope.size)
+    line1 = ax.plot(t, values)[0]
+    line2 = ax.plot(t, volumes)[0]
+
+    def animate(_):
+        if not ac_player.connected():
+            plt.close(fig)
+            return []
+        _, values, volumes = ac_player.scope.read()
+        line1.set_ydata(values)
+        line2.set_ydata(volumes)
+        return [line1, line2]
+
+    an = animation.FuncAnimation(  # noqa: F841
+        fig, animate,
+        interval=viewport_interval,
+        cache_frame_data=False,
+        blit=True
+    )
 
-    viewport_size = 20000
+    ax.grid(True)
+    plt.show()
+
+
+def wait(ac_player, duration, stat_interval):
+    now = time.monotonic()
+    end = now + duration if duration else None
+    next_stat = now + stat_interval
+    while ac_player.connected():
+        now = time.monotonic()
+        if end is not None and now >= end:
+            break
+        if stat_interval and now >= next_stat:
+            # the clip meters count per window, the total is printed once as clipped
+            levels = {name: value for name, value in ac_player.levels().items() if not name.startswith("clip")}
+            print("%s, received %d B, recorded %d B (%d B on disk, %d B dropped)%s, %d volume samples, volume %.0f, %s, %d clipped, %d reconnects, %.1f s down" % (
+                "online" if ac_player.online() else "reconnecting",
+                ac_player.received(), ac_player.recorded(), ac_player.stored(), ac_player.dropped(),
+                ", %d events" % ac_player.events() if ac_player.triggering() else "",
+                ac_player.recorded_volume_samples(),
+                ac_player.volume(), format_levels(levels), ac_player.clips(),
+                ac_player.reconnects(), ac_player.downtime()
+            ))
+            next_stat += stat_interval
+        time.sleep(0.1)
 
-    viewport_interval = 200
 
-    ac_player = AcPlayer()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="receive a transmitter without the GUI")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--package-size", type=int, default=4096)
+    parser.add_argument("--timeout", type=int, default=5000)
+    parser.add_argument("--password", default="0000")
+    parser.add_argument("--samples-per-sec", type=int, default=44100)
+    parser.add_argument("--bits-per-sample", type=int, default=16, choices=[8, 16])
+    parser.add_argument("--volume-T", type=int, default=10)
+    parser.add_argument("--volume-K", type=float, default=0.1)
+    parser.add_argument("--meters", default=DEFAULT_METERS, help="kind[:time constant in s],... with kind peak, rms or clip")
+    parser.add_argument("--reconnect", action="store_true", help="reconnect with backoff and keep the recordings going")
+    parser.add_argument("--max-backoff", type=float, default=30)
+    parser.add_argument("--play", action="store_true")
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--header-interval", type=float, default=5)
+    parser.add_argument("--max-gap-fill", type=float, default=60, help="seconds of silence written for a connection loss")
+    parser.add_argument("--trigger", type=float, help="record only events: volume that opens a segment")
+    parser.add_argument("--release", type=float, help="volume the envelope has to stay below for --hold seconds to close it")
+    parser.add_argument("--pre-roll", type=float, default=5, help="seconds kept before the trigger")
+    parser.add_argument("--hold", type=float, default=2)
+    parser.add_argument("--segment-seconds", type=float, help="start a new file every N seconds")
+    parser.add_argument("--segment-size", type=int, help="start a new file every N bytes of audio")
+    parser.add_argument("--compression", choices=["gzip"], help="write .wav.gz files")
+    parser.add_argument("--record-volume", action="store_true")
+    parser.add_argument("--volume-format", choices=["binary", "text"], default="binary")
+    parser.add_argument("--log-meters", action="store_true", help="append the meter columns to the volume log")
+    parser.add_argument("--draw", action="store_true", help="show the scope window (needs matplotlib)")
+    parser.add_argument("--viewport-size", type=int, default=20000)
+    parser.add_argument("--viewport-interval", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=0, help="seconds, 0 to run until disconnected or Ctrl+C")
+    parser.add_argument("--stat-interval", type=float, default=10)
+    args = parser.parse_args()
+
+    ac_metrics = metrics.from_env()
+    if ac_metrics:
+        # the periodic metrics line is logged at INFO, which the last-resort handler would drop
+        logging.basicConfig(format="%(asctime)s %(message)s", stream=sys.stdout)
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    ac_player = AcPlayer(ac_metrics, analyze=args.draw, meters=args.meters)
     ac_player.connect(
-        address,
-        port,
-        package_size,
-        timeout,
-        password,
-
-        samples_per_sec,
-        bits_per_sample,
-        volume_T,
-        volume_K,
-
-        viewport_size
+        args.address,
+        args.port,
+        args.package_size,
+        args.timeout,
+        args.password,
+
+        args.samples_per_sec,
+        args.bits_per_sample,
+        args.volume_T,
+        args.volume_K,
+
+        args.viewport_size,
+        args.reconnect,
+        args.max_backoff
     )
 
-    if start_play:
+    if args.play:
         ac_player.start_play()
 
-    if start_record:
-        ac_player.start_record()
-
-    if start_record_volume:
-        ac_player.start_record_volume()
-
-    if start_draw:
-        fig, ax = plt.subplots()
-
-        ax.set_xlim([0, viewport_size])
-        amplitude = 128 if bits_per_sample == 8 else 32768
-        ax.set_ylim([-amplitude, amplitude])
-
-        with ac_player.buffer_mutex:
-            t = [int(i / ac_player.buffer_size * viewport_size) for i in range(ac_player.buffer_size)]
-            line1 = ax.plot(t, ac_player.values)[0]
-            line2 = ax.plot(t, ac_player.volumes)[0]
-
-        def animate(_):
-            if not ac_player.connected():
-                plt.close(fig)
-                return []
-            with ac_player.buffer_mutex:
-                line1.set_ydata(ac_player.values)
-                line2.set_ydata(ac_player.volumes)
-            return [line1, line2]
-
-        an = animation.FuncAnimation(
-            fig, animate,
-            interval=viewport_interval,
-            cache_frame_data=False,
-            blit=True
+    if args.record:
+        ac_player.start_record(
+            args.header_interval, args.max_gap_fill, args.trigger, args.release, args.pre_roll, args.hold,
+            args.segment_seconds, args.segment_size, args.compression
         )
 
-        ax.grid(True)
-        plt.show()
-        ac_player.disconnect()
-    else:
-        def cmd_target():
-            while True:
-                cmd = input("Enter exit to exit: ")
-                if cmd == "exit":
-                    ac_player.disconnect()
-                    break
-
-        cmd_thread = Thread(target=cmd_target)
-        cmd_thread.start()
-        cmd_thread.join()
+    if args.record_volume:
+        ac_player.start_record_volume(args.volume_format == "binary", args.log_meters)
+
+    try:
+        if args.draw:
+            draw(ac_player, args.viewport_size, args.viewport_interval)
+        else:
+            wait(ac_player, args.duration, args.stat_interval)
+    except KeyboardInterrupt:
+        pass
+    ac_player.close()
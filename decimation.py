@@ -0,0 +1,31 @@
+import numpy as np
+from ring_buffer import RingBuffer
+
+
+class MinMaxDecimator:
+    def __init__(self, size, bucket_size, dtype):
+        self.bucket_size = bucket_size
+        self.mins = RingBuffer(size // bucket_size, dtype)
+        self.maxs = RingBuffer(size // bucket_size, dtype)
+        self.__partial = np.empty(0, dtype=dtype)
+
+    def append(self, values):
+        if len(self.__partial):
+            values = np.concatenate((self.__partial, values))
+        n = len(values) // self.bucket_size * self.bucket_size
+        if n:
+            buckets = values[:n].reshape(-1, self.bucket_size)
+            self.mins.append(buckets.min(axis=1))
+            self.maxs.append(buckets.max(axis=1))
+        self.__partial = values[n:].copy()
+
+
+def minmax_columns(mins, maxs, columns):
+    n = len(mins)
+    if n > columns > 0:
+        index = np.unique(np.linspace(0, n, columns, endpoint=False).astype(np.int64))
+        mins = np.minimum.reduceat(mins, index)
+        maxs = np.maximum.reduceat(maxs, index)
+    else:
+        index = np.arange(n)
+    return np.repeat(index, 2), np.column_stack((mins, maxs)).ravel()
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+
+
+def make_signal(samples_per_sec, bits_per_sample, frequency=440):
+    t = np.arange(samples_per_sec) / samples_per_sec
+    amplitude = 127 if bits_per_sample == 8 else 32767
+    signal = amplitude * 0.5 * np.sin(2 * np.pi * frequency * t) * (1 + np.sin(2 * np.pi * t)) / 2
+    return signal.astype(np.int8 if bits_per_sample == 8 else "<i2").tobytes()
+
+
+class FakeTransmitter:
+    def __init__(self, password="0000", speed=1, chunk_size=4096, burst=1, disconnect_after=0, stall=0):
+        self.password = password
+        self.speed = speed
+        self.chunk_size = chunk_size
+        self.burst = burst
+        self.disconnect_after = disconnect_after
+        self.stall = stall
+        self.clients = 0
+        self.sent = 0
+
+    async def handle(self, reader, writer):
+        try:
+            cmd = await reader.readexactly(1)
+            n = int.from_bytes(await reader.readexactly(4), "little")
+            p = await reader.readexactly(n)
+            samples_per_sec = int.from_bytes(await reader.readexactly(4), "little")
+            bits_per_sample = int.from_bytes(await reader.readexactly(4), "little")
+            if (
+                cmd != b"\x03" or
+                p != hashlib.md5(self.password.encode("utf-8")).hexdigest().encode("utf-8") or
+                bits_per_sample not in (8, 16) or
+                samples_per_sec <= 0
+            ):
+                writer.write(b"\x00")
+                await writer.drain()
+                return
+            writer.write(b"\x01")
+            self.clients += 1
+            try:
+                await self.stream(writer, samples_per_sec, bits_per_sample)
+            finally:
+                self.clients -= 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, writer, samples_per_sec, bits_per_sample):
+        loop = asyncio.get_running_loop()
+        signal = make_signal(samples_per_sec, bits_per_sample)
+        period = len(signal)
+        signal *= self.chunk_size // period + 2
+        interval = self.chunk_size / (samples_per_sec * bits_per_sample / 8) / self.speed if self.speed > 0 else 0
+        pos = 0
+        next_time = loop.time()
+        end_time = next_time + self.disconnect_after
+        while True:
+            if self.disconnect_after and loop.time() >= end_time:
+                # a dead Wi-Fi link first goes silent, then the connection drops
+                await asyncio.sleep(self.stall)
+                return
+            for _ in range(self.burst):
+                writer.write(signal[pos:pos + self.chunk_size])
+                self.sent += self.chunk_size
+                pos = (pos + self.chunk_size) % period
+            await writer.drain()
+            if interval:
+                next_time += interval * self.burst
+                await asyncio.sleep(max(next_time - loop.time(), 0))
+
+    async def start(self, address, port):
+        return await asyncio.start_server(self.handle, address, port)
+
+
+async def serve(address, ports, password, speed, chunk_size, burst, disconnect_after=0, stall=0):
+    transmitter = FakeTransmitter(password, speed, chunk_size, burst, disconnect_after, stall)
+    servers = [await transmitter.start(address, port) for port in ports]
+    print("Fake transmitter on %s:%s" % (address, ",".join(str(port) for port in ports)))
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--count", type=int, default=1, help="listen on COUNT consecutive ports")
+    parser.add_argument("--password", default="0000")
+    parser.add_argument("--speed", type=float, default=1, help="multiple of real time, 0 to send as fast as possible")
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--burst", type=int, default=1, help="chunks sent back to back before pausing")
+    parser.add_argument("--disconnect-after", type=float, default=0, help="drop each connection after this many seconds")
+    parser.add_argument("--stall", type=float, default=0, help="seconds of silence before a drop")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(
+            args.address, range(args.port, args.port + args.count), args.password, args.speed, args.chunk_size, args.burst,
+            args.disconnect_after, args.stall
+        ))
+    except KeyboardInterrupt:
+        pass
@@ -1,3 +1,4 @@
+import startup  # noqa: F401
 import sys
 import os
 from PySide6.QtWidgets import QApplication
@@ -1,15 +1,55 @@
-from PySide6.QtWidgets import QMainWindow
-from PySide6.QtCore import Qt, QObject, Signal, QTimer
+from PySide6.QtWidgets import QMainWindow, QFileDialog, QSizePolicy, QWidget
+from PySide6.QtCore import Qt, QObject, QSize, Signal, QTimer
+from PySide6.QtGui import QImage, QPainter
 from main_window_ui import Ui_MainWindow
-from matplotlib.backends.backend_qtagg import FigureCanvas
-from matplotlib.figure import Figure
+import time
 from core import AcPlayer
+import metrics
+from meters import format_levels
+from renderer import ScopeRenderer, SpectrumRenderer
 
 
 class Signaller(QObject):
     signal = Signal()
 
 
+class FrameView(QWidget):
+    def __init__(self, renderer):
+        super().__init__()
+        self.renderer = renderer
+        self.paint_time = 0
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.__frame = None
+        self.__image = None
+
+        # frames are announced from the render thread and picked up here on the GUI thread
+        self.__signaller = Signaller()
+        self.__signaller.signal.connect(lambda: self.show_frame(self.renderer.take()))
+        renderer.on_frame = lambda: self.__signaller.signal.emit()
+
+    def show_frame(self, frame):
+        if frame is None:
+            return
+        # the frame owns the pixels, the image only wraps them
+        self.__frame = frame
+        self.__image = QImage(frame.rgba.data, frame.width, frame.height, frame.width * 4, QImage.Format_RGBA8888)
+        self.update()
+
+    def sizeHint(self):
+        # what the matplotlib canvas asked for with a default figure
+        return QSize(640, 480)
+
+    def paintEvent(self, _):
+        if self.__image is not None:
+            t0 = time.perf_counter()
+            QPainter(self).drawImage(self.rect(), self.__image)
+            self.paint_time += time.perf_counter() - t0
+
+    def resizeEvent(self, _):
+        ratio = self.devicePixelRatioF()
+        self.renderer.resize(int(self.width() * ratio), int(self.height() * ratio))
+
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -24,14 +64,19 @@ class MainWindow(QMainWindow):
         self.__signaller = Signaller()
         self.__signaller.signal.connect(self.__update_ui)
 
-        self.__ac_player = AcPlayer()
+        self.__metrics = metrics.from_env()
+        self.__ac_player = AcPlayer(self.__metrics)
         self.__ac_player.on_change = lambda: self.__signaller.signal.emit()
 
         self.ui.connect.clicked.connect(self.connect_clicked)
+        self.ui.replay.clicked.connect(self.replay_clicked)
         self.ui.startPlay.clicked.connect(self.startPlay_clicked)
         self.ui.startRecord.clicked.connect(self.startRecord_clicked)
         self.ui.startRecordVolume.clicked.connect(self.startRecordVolume_clicked)
         self.ui.startDraw.clicked.connect(self.startDraw_clicked)
+        self.ui.decimation.toggled.connect(self.decimation_toggled)
+        self.ui.blit.toggled.connect(self.blit_toggled)
+        self.ui.spectrum.toggled.connect(self.spectrum_toggled)
 
         for i in range(self.ui.samplesPerSec.count()):
             self.ui.samplesPerSec.setItemData(i, int(self.ui.samplesPerSec.itemText(i)), Qt.UserRole)
@@ -39,26 +84,28 @@ class MainWindow(QMainWindow):
         for i in range(self.ui.bitsPerSample.count()):
             self.ui.bitsPerSample.setItemData(i, int(self.ui.bitsPerSample.itemText(i)), Qt.UserRole)
 
-        self.__canvas = FigureCanvas(Figure())
-        self.ui.verticalLayout.addWidget(self.__canvas)
-        self.__ax = self.__canvas.figure.subplots()
-        self.__ax.grid(True)
-        self.__line1 = self.__ax.plot([], [])[0]
-        self.__line2 = self.__ax.plot([], [])[0]
-        self.__timer = self.__canvas.new_timer()
-        self.__timer.add_callback(self.__update_canvas)
-        self.__timer.interval = 0
+        # both panels are drawn on worker threads, this thread only paints the finished frames
+        self.__renderer = ScopeRenderer(lambda: self.__ac_player.scope)
+        self.__renderer.metrics = self.__metrics
+        self.__view = FrameView(self.__renderer)
+        self.ui.verticalLayout.addWidget(self.__view)
+        self.__spectrum_renderer = SpectrumRenderer(lambda: self.__ac_player.spectrogram)
+        self.__spectrum_renderer.metrics = self.__metrics
+        self.__spectrum_view = FrameView(self.__spectrum_renderer)
+        self.ui.spectrumLayout.addWidget(self.__spectrum_view)
+        self.__frames = 0
+        self.__render_time = 0
+        self.__skipped = 0
+        self.__paint_time = 0
+        self.__stat_time = time.perf_counter()
+        self.__drawing = False
 
         self.__init_graph()
+        self.decimation_toggled()
+        self.blit_toggled()
 
         self.__update_ui()
 
-    def __update_canvas(self):
-        with self.__ac_player.buffer_mutex:
-            self.__line1.set_ydata(self.__ac_player.values)
-            self.__line2.set_ydata(self.__ac_player.volumes)
-        self.__canvas.draw()
-
     def __update_ui(self):
         self.ui.address.setEnabled(not self.__ac_player.connected())
         self.ui.port.setEnabled(not self.__ac_player.connected())
@@ -71,9 +118,18 @@ class MainWindow(QMainWindow):
         self.ui.volumeK.setEnabled(not self.__ac_player.connected())
         self.ui.viewportSize.setEnabled(not self.__ac_player.connected())
         self.ui.viewportUpdateInterval.setEnabled(not self.__ac_player.connected())
+        self.ui.reconnect.setEnabled(not self.__ac_player.connected())
+
+        self.ui.replay.setEnabled(not self.__ac_player.connected())
 
         self.ui.startPlay.setEnabled(self.__ac_player.connected())
+        self.ui.playbackLatency.setEnabled(not self.__ac_player.playing())
         self.ui.startRecord.setEnabled(self.__ac_player.connected())
+        self.ui.recordTrigger.setEnabled(not self.__ac_player.recording())
+        self.ui.recordRelease.setEnabled(not self.__ac_player.recording())
+        self.ui.preRoll.setEnabled(not self.__ac_player.recording())
+        self.ui.segmentMinutes.setEnabled(not self.__ac_player.recording())
+        self.ui.compress.setEnabled(not self.__ac_player.recording())
         self.ui.startRecordVolume.setEnabled(self.__ac_player.connected())
         self.ui.startDraw.setEnabled(self.__ac_player.connected())
 
@@ -81,26 +137,55 @@ class MainWindow(QMainWindow):
         self.ui.startPlay.setText("Stop Play" if self.__ac_player.playing() else "Start Play")
         self.ui.startRecord.setText("Stop Record" if self.__ac_player.recording() else "Start Record")
         self.ui.startRecordVolume.setText("Stop Record Volume" if self.__ac_player.recording_volume() else "Start Record Volume")
-        self.ui.startDraw.setText("Stop Draw" if self.__timer.interval > 0 else "Start Draw")
+        self.ui.startDraw.setText("Stop Draw" if self.__drawing else "Start Draw")
 
     def __init_graph(self):
-        self.__ax.set_xlim([0, self.ui.viewportSize.value()])
         amplitude = 128 if self.ui.bitsPerSample.currentData() == 8 else 32768
-        self.__ax.set_ylim([-amplitude, amplitude])
-
-        with self.__ac_player.buffer_mutex:
-            t = [int(i / self.__ac_player.buffer_size * self.ui.viewportSize.value()) for i in range(self.__ac_player.buffer_size)]
-            self.__line1.set_data(t, self.__ac_player.values)
-            self.__line2.set_data(t, self.__ac_player.volumes)
+        self.__renderer.configure(self.ui.viewportSize.value(), amplitude)
+        self.__spectrum_renderer.redraw()
 
     def __update_stat(self):
         self.ui.received.setText(str(self.__ac_player.received()))
-        self.ui.recorded.setText(str(self.__ac_player.recorded()))
+        recorded = str(self.__ac_player.recorded())
+        if self.__ac_player.recording() and self.ui.compress.isChecked():
+            recorded += " ({} on disk)".format(self.__ac_player.stored())
+        if self.__ac_player.dropped():
+            recorded += " ({} dropped)".format(self.__ac_player.dropped())
+        self.ui.recorded.setText(
+            "{} ({} events{})".format(
+                recorded, self.__ac_player.events(), ", recording" if self.__ac_player.triggered() else ""
+            ) if self.ui.recordTrigger.value() else recorded
+        )
         self.ui.recordedVolumeSamples.setText(str(self.__ac_player.recorded_volume_samples()))
         amplitude = 128 if self.ui.bitsPerSample.currentData() == 8 else 32768
         volume = self.__ac_player.volume() / amplitude * 100
         self.ui.volumeIndicator.setValue(volume)
         self.ui.volumeValue.setText("{:.2f}% ({})".format(volume, int(self.__ac_player.volume())))
+        self.ui.meters.setText("{}, {} clipped".format(format_levels(self.__ac_player.levels()), self.__ac_player.clips()))
+        now = time.perf_counter()
+        renderer = self.__renderer
+        frames = renderer.frames - self.__frames
+        skipped = renderer.skipped + self.__spectrum_renderer.skipped
+        paint_time = self.__view.paint_time + self.__spectrum_view.paint_time
+        self.ui.drawRate.setText("{:.1f} fps, {:.1f} ms per frame off-thread, {:.1f} ms/s painting, {} skipped".format(
+            frames / (now - self.__stat_time),
+            (renderer.render_time - self.__render_time) / frames * 1000 if frames else 0,
+            (paint_time - self.__paint_time) / (now - self.__stat_time) * 1000,
+            skipped - self.__skipped
+        ))
+        self.__frames = renderer.frames
+        self.__render_time = renderer.render_time
+        self.__skipped = skipped
+        self.__paint_time = paint_time
+        self.__stat_time = now
+        stat = self.__ac_player.playback_stat()
+        self.ui.playback.setText(
+            "{depth:.0f} ms buffered, {underruns} underruns, {dropped} dropped".format(**stat) if stat else "0"
+        )
+        self.ui.connection.setText("{}, {} reconnects, {:.1f} s down".format(
+            ("online" if self.__ac_player.online() else "reconnecting") if self.__ac_player.connected() else "offline",
+            self.__ac_player.reconnects(), self.__ac_player.downtime()
+        ))
 
     def connect_clicked(self):
         if not self.__ac_player.connected():
@@ -116,20 +201,50 @@ class MainWindow(QMainWindow):
                 self.ui.volumeT.value(),
                 self.ui.volumeK.value(),
 
-                self.ui.viewportSize.value()
+                self.ui.viewportSize.value(),
+                self.ui.reconnect.isChecked()
             )
         else:
             self.__ac_player.disconnect()
 
+    def replay_clicked(self):
+        filename, _ = QFileDialog.getOpenFileName(self, "Replay", "data", "WAV (*.wav *.wav.gz)")
+        if not filename:
+            return
+        self.__ac_player.replay(
+            filename,
+            self.ui.packageSize.value(),
+            1,
+            self.ui.volumeT.value(),
+            self.ui.volumeK.value(),
+
+            self.ui.viewportSize.value()
+        )
+        for combo, value in (
+            (self.ui.samplesPerSec, self.__ac_player.samples_per_sec()),
+            (self.ui.bitsPerSample, self.__ac_player.bits_per_sample())
+        ):
+            i = combo.findData(value, Qt.UserRole)
+            if i >= 0:
+                combo.setCurrentIndex(i)
+
     def startPlay_clicked(self):
         if not self.__ac_player.playing():
-            self.__ac_player.start_play()
+            self.__ac_player.start_play(self.ui.playbackLatency.value(), max(self.ui.playbackLatency.value() * 5, 500))
         else:
             self.__ac_player.stop_play()
 
     def startRecord_clicked(self):
         if not self.__ac_player.recording():
-            self.__ac_player.start_record()
+            amplitude = 128 if self.__ac_player.bits_per_sample() == 8 else 32768
+            trigger = self.ui.recordTrigger.value()
+            self.__ac_player.start_record(
+                attack=trigger * amplitude / 100 if trigger else None,
+                release=self.ui.recordRelease.value() * amplitude / 100,
+                pre_roll=self.ui.preRoll.value(),
+                segment_seconds=self.ui.segmentMinutes.value() * 60 or None,
+                compression="gzip" if self.ui.compress.isChecked() else None
+            )
         else:
             self.__ac_player.stop_record()
 
@@ -139,12 +254,30 @@ class MainWindow(QMainWindow):
         else:
             self.__ac_player.stop_record_volume()
 
+    def decimation_toggled(self):
+        self.__renderer.set_decimation(self.ui.decimation.isChecked())
+
+    def blit_toggled(self):
+        self.__renderer.set_blit(self.ui.blit.isChecked())
+        self.__spectrum_renderer.set_blit(self.ui.blit.isChecked())
+
+    def spectrum_toggled(self):
+        self.__spectrum_view.setVisible(self.ui.spectrum.isChecked())
+        if self.__drawing and self.ui.spectrum.isChecked():
+            self.__spectrum_renderer.start()
+        else:
+            self.__spectrum_renderer.stop()
+
     def startDraw_clicked(self):
-        if self.__timer.interval == 0:
-            self.__timer.interval = self.ui.viewportUpdateInterval.value()
+        if not self.__drawing:
+            self.__drawing = True
+            self.__renderer.interval = self.ui.viewportUpdateInterval.value()
+            self.__spectrum_renderer.interval = self.ui.viewportUpdateInterval.value()
             self.__init_graph()
-            self.__timer.start()
+            self.__renderer.start()
+            self.spectrum_toggled()
         else:
-            self.__timer.stop()
-            self.__timer.interval = 0
+            self.__renderer.stop()
+            self.__spectrum_renderer.stop()
+            self.__drawing = False
         self.__update_ui()
@@ -0,0 +1,122 @@
+import math
+import numpy as np
+
+
+DEFAULT_METERS = "peak:1.5,rms:0.3,rms:3,clip"
+FLOOR_DB = -120
+
+
+def parse_meters(spec):
+    meters = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        kind, _, tau = item.partition(":")
+        if kind not in ("peak", "rms", "clip"):
+            raise ValueError("parse_meters: unknown meter: %s" % item)
+        meters.append((item, kind, float(tau) if tau else 0))
+    return meters
+
+
+def dbfs(values, full_scale):
+    return 20 * np.log10(np.maximum(np.asarray(values, dtype=np.float64) / full_scale, 10 ** (FLOOR_DB / 20)))
+
+
+def format_levels(levels):
+    return ", ".join(
+        "%s %d" % (name, value) if name.startswith("clip") else "%s %.1f dBFS" % (name, value)
+        for name, value in levels.items()
+    )
+
+
+class MeterBank:
+    def __init__(self, block_size, bits_per_sample, meters=DEFAULT_METERS, samples_per_sec=None):
+        # meters share the envelope blocks, so every volume log row gets one value per meter
+        self.meters = parse_meters(meters) if isinstance(meters, str) else list(meters)
+        self.names = [name for name, _, _ in self.meters]
+        self.full_scale = 128 if bits_per_sample == 8 else 32768
+        self.clip_level = self.full_scale - 1
+
+        kinds = np.array([kind for _, kind, _ in self.meters])
+        block_time = block_size / samples_per_sec if samples_per_sec else 0
+        self.__N = max(block_size, 1)
+        self.__peak = kinds == "peak"
+        self.__rms = kinds == "rms"
+        self.__clip = kinds == "clip"
+        # clip counts are not smoothed, peaks fall back and mean squares follow with the time constant
+        self.__decay = np.array([
+            math.exp(-block_time / tau) if tau > 0 and kind != "clip" else 0
+            for _, kind, tau in self.meters
+        ])
+        self.__state = np.zeros(len(self.meters))
+
+        self.__block_peak = 0
+        self.__block_power = 0
+        self.__block_clips = 0
+        self.__count = 0
+
+        self.values = np.zeros(len(self.meters))
+        self.peak = 0
+        self.clips = 0
+
+    def process(self, values):
+        n = len(values)
+        amplitudes = np.abs(values.astype(np.int32))
+        if n:
+            self.peak = max(self.peak, int(amplitudes.max()))
+
+        ends = np.arange(self.__N - self.__count - 1, n, self.__N)
+        if len(ends) == 0:
+            if n:
+                self.__accumulate(amplitudes)
+            return np.zeros((0, len(self.meters)), dtype=np.float32)
+
+        # one reduction per statistic for all blocks, whatever the number of meters
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        head = amplitudes[:ends[-1] + 1]
+        block_peak = np.maximum.reduceat(head, starts).astype(np.float64)
+        block_power = np.add.reduceat(head.astype(np.int64) ** 2, starts).astype(np.float64)
+        block_clips = np.add.reduceat((head >= self.clip_level).astype(np.int64), starts)
+        block_peak[0] = max(block_peak[0], self.__block_peak)
+        block_power[0] += self.__block_power
+        block_clips[0] += self.__block_clips
+        self.clips += int(block_clips.sum())
+
+        inputs = np.empty((len(ends), len(self.meters)))
+        inputs[:, self.__peak] = block_peak[:, None]
+        inputs[:, self.__rms] = (block_power / self.__N)[:, None]
+        inputs[:, self.__clip] = block_clips[:, None]
+
+        # the recursion runs along the blocks, each step updates every meter at once
+        decay = self.__decay
+        state = self.__state
+        out = np.empty_like(inputs)
+        for i in range(len(inputs)):
+            x = inputs[i]
+            state = np.where(self.__peak, np.maximum(x, state * decay), state * decay + x * (1 - decay))
+            out[i] = state
+        self.__state = state
+        out[:, self.__rms] = np.sqrt(out[:, self.__rms])
+        self.values = out[-1]
+
+        self.__block_peak = 0
+        self.__block_power = 0
+        self.__block_clips = 0
+        self.__count = 0
+        self.__accumulate(amplitudes[ends[-1] + 1:])
+
+        return out.astype(np.float32)
+
+    def levels(self):
+        # peak and rms meters in dBFS, clip meters as counts
+        values = self.values
+        return dict(zip(self.names, np.where(self.__clip, values, dbfs(values, self.full_scale)).tolist()))
+
+    def __accumulate(self, amplitudes):
+        if not len(amplitudes):
+            return
+        self.__block_peak = max(self.__block_peak, int(amplitudes.max()))
+        self.__block_power += int(np.dot(amplitudes.astype(np.int64), amplitudes))
+        self.__block_clips += int(np.count_nonzero(amplitudes >= self.clip_level))
+        self.__count += len(amplitudes)
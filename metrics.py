@@ -0,0 +1,196 @@
+import bisect
+import logging
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        rank = q * self.count
+        total = 0
+        for i, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return 0
+
+
+class TimedLock:
+    def __init__(self, lock, metrics, name):
+        self.__lock = lock
+        self.__metrics = metrics
+        self.__name = name
+
+    def acquire(self, *args):
+        t0 = time.perf_counter()
+        result = self.__lock.acquire(*args)
+        self.__metrics.observe(self.__name, time.perf_counter() - t0)
+        return result
+
+    def release(self):
+        self.__lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *_):
+        self.release()
+
+
+class Metrics:
+    def __init__(self, prefix="ac"):
+        self.prefix = prefix
+        self.__counters = {}
+        self.__histograms = {}
+        self.__gauges = {}
+        self.__mutex = Lock()
+        self.__stop = Event()
+        self.__server = None
+
+    def add(self, name, value=1):
+        with self.__mutex:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self.__mutex:
+            histogram = self.__histograms.get(name)
+            if histogram is None:
+                histogram = self.__histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def gauge(self, name, fn, label=None):
+        self.__gauges[name] = (fn, label)
+
+    def lock(self, name, lock):
+        return TimedLock(lock, self, name + "_wait_seconds")
+
+    def snapshot(self):
+        with self.__mutex:
+            counters = dict(self.__counters)
+            histograms = {
+                name: {
+                    "count": h.count, "sum": h.sum, "max": h.max,
+                    "p50": h.quantile(0.5), "p99": h.quantile(0.99),
+                    "buckets": list(zip(h.buckets, h.counts))
+                }
+                for name, h in self.__histograms.items()
+            }
+        gauges = {}
+        for name, (fn, label) in list(self.__gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception as e:
+                print("Metrics.snapshot: %s: %s" % (name, e))
+        return {"time": time.time(), "counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append("# TYPE %s_%s_total counter" % (self.prefix, name))
+            lines.append("%s_%s_total %s" % (self.prefix, name, value))
+        for name, h in sorted(snapshot["histograms"].items()):
+            lines.append("# TYPE %s_%s histogram" % (self.prefix, name))
+            total = 0
+            for bound, count in h["buckets"]:
+                total += count
+                lines.append('%s_%s_bucket{le="%g"} %d' % (self.prefix, name, bound, total))
+            lines.append('%s_%s_bucket{le="+Inf"} %d' % (self.prefix, name, h["count"]))
+            lines.append("%s_%s_sum %s" % (self.prefix, name, h["sum"]))
+            lines.append("%s_%s_count %d" % (self.prefix, name, h["count"]))
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines.append("# TYPE %s_%s gauge" % (self.prefix, name))
+            if isinstance(value, dict):
+                label = self.__gauges[name][1]
+                for key, v in sorted(value.items()):
+                    lines.append('%s_%s{%s="%s"} %s' % (self.prefix, name, label, key, v))
+            else:
+                lines.append("%s_%s %s" % (self.prefix, name, value))
+        return "\n".join(lines) + "\n"
+
+    def log_line(self, snapshot, previous):
+        elapsed = snapshot["time"] - previous["time"] if previous else 0
+        parts = []
+        for name, value in sorted(snapshot["counters"].items()):
+            if elapsed:
+                parts.append("%s %.0f/s" % (name, (value - previous["counters"].get(name, 0)) / elapsed))
+            else:
+                parts.append("%s %s" % (name, value))
+        for name, h in sorted(snapshot["histograms"].items()):
+            parts.append("%s p50 %.2f ms p99 %.2f ms max %.2f ms" % (name, h["p50"] * 1000, h["p99"] * 1000, h["max"] * 1000))
+        for name, value in sorted(snapshot["gauges"].items()):
+            if isinstance(value, dict):
+                parts.append("%s %s" % (name, " ".join("%s=%.4g" % item for item in sorted(value.items()))))
+            else:
+                parts.append("%s %.4g" % (name, value))
+        return ", ".join(parts)
+
+    def start(self, log_interval=None, port=None, address="127.0.0.1"):
+        if log_interval:
+            Thread(target=self.__log_target, args=(log_interval,), daemon=True).start()
+        if port:
+            metrics = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = metrics.prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *_):
+                    pass
+
+            self.__server = ThreadingHTTPServer((address, port), Handler)
+            Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def __log_target(self, interval):
+        logger = logging.getLogger("metrics")
+        logger.setLevel(logging.INFO)
+        previous = None
+        while not self.__stop.wait(interval):
+            snapshot = self.snapshot()
+            logger.info(self.log_line(snapshot, previous))
+            previous = snapshot
+
+
+def from_env():
+    if not os.environ.get("AC_METRICS"):
+        return None
+    metrics = Metrics()
+    metrics.start(
+        log_interval=float(os.environ.get("AC_METRICS_LOG_INTERVAL", 10)),
+        port=int(os.environ.get("AC_METRICS_PORT", 0)) or None
+    )
+    return metrics
@@ -0,0 +1,220 @@
+import asyncio
+import argparse
+import time
+from datetime import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from core import make_play_cmd, decode_samples, VolumeEnvelope
+from wav import WavWriter
+from volume_log import VolumeLogWriter, TextVolumeLogWriter
+from scope import Scope
+
+
+class Stream:
+    def __init__(
+        self,
+        name, address, port, package_size, timeout, password,
+        samples_per_sec, bits_per_sample, volume_T, volume_K,
+        viewport_size=None, record=False, record_volume=False, binary_volume_log=True, executor=None
+    ):
+        self.name = name
+        self.address = address
+        self.port = port
+        self.package_size = package_size
+        self.timeout = timeout
+        self.password = password
+        self.samples_per_sec = samples_per_sec
+        self.bits_per_sample = bits_per_sample
+        self.record = record
+        self.record_volume = record_volume
+        self.binary_volume_log = binary_volume_log
+        # the file writes of all streams share one thread, see MultiReceiver
+        self.executor = executor
+
+        self.envelope = VolumeEnvelope(int(samples_per_sec * volume_T / 100), volume_K)
+        self.scope = Scope(
+            int(viewport_size * samples_per_sec / 1000),
+            np.int8 if bits_per_sample == 8 else np.int16
+        ) if viewport_size else None
+
+        self.connected = False
+        self.error = None
+        self.started = None
+        self.received = 0
+        self.packages = 0
+        self.recorded = 0
+        self.recorded_volume_samples = 0
+
+        self.__f = None
+        self.__f_volume = None
+
+    def volume(self):
+        return self.envelope.volume
+
+    def stat(self):
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {
+            "name": self.name,
+            "connected": self.connected,
+            "error": self.error,
+            "received": self.received,
+            "packages": self.packages,
+            "bytes_per_sec": self.received / elapsed if elapsed else 0,
+            "recorded": self.recorded,
+            "recorded_volume_samples": self.recorded_volume_samples,
+            "volume": self.volume()
+        }
+
+    async def run(self):
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.address, self.port),
+                self.timeout / 1000
+            )
+            writer.write(make_play_cmd(self.password, self.samples_per_sec, self.bits_per_sample))
+            await writer.drain()
+            data = await asyncio.wait_for(reader.read(1), self.timeout / 1000)
+            if data != b"\x01":
+                raise RuntimeError("play cmd: unexpected response: %s" % data)
+
+            self.connected = True
+            self.started = time.monotonic()
+            self.__open_sinks()
+
+            bytes_per_sample = self.bits_per_sample // 8
+            rem = b""
+            while True:
+                data = await reader.read(self.package_size)
+                if not data:
+                    break
+                data = rem + data
+                n = len(data) - len(data) % bytes_per_sample
+                rem = data[n:]
+                self.received += len(data) - len(rem)
+                self.packages += 1
+                if n:
+                    self.__process(data[:n])
+        except Exception as e:
+            self.error = str(e)
+            print("Stream.run: %s: %s" % (self.name, e))
+        finally:
+            self.connected = False
+            if writer is not None:
+                writer.close()
+            await self.__close_sinks()
+
+    def __open_sinks(self):
+        name = time.strftime("data/%Y-%m-%d %H-%M-%S ") + self.name
+        if self.record:
+            self.__f = WavWriter(name + ".wav", self.samples_per_sec, 1, self.bits_per_sample, executor=self.executor)
+        if self.record_volume:
+            if self.binary_volume_log:
+                self.__f_volume = VolumeLogWriter(name + ".vol", executor=self.executor)
+            else:
+                self.__f_volume = TextVolumeLogWriter(name + ".txt", executor=self.executor)
+
+    async def __close_sinks(self):
+        # the last flush goes to the disk, the other streams keep running meanwhile
+        loop = asyncio.get_running_loop()
+        if self.__f is not None:
+            try:
+                await loop.run_in_executor(self.executor, self.__f.close)
+            except Exception as e:
+                print("Stream.__close_sinks: %s: recorder error: %s" % (self.name, e))
+            self.__f = None
+        if self.__f_volume is not None:
+            try:
+                await loop.run_in_executor(self.executor, self.__f_volume.close)
+            except Exception as e:
+                print("Stream.__close_sinks: %s: volume recorder error: %s" % (self.name, e))
+            self.__f_volume = None
+
+    def __process(self, data):
+        if self.__f is not None:
+            self.__f.write(data)
+            self.recorded += len(data)
+
+        values = decode_samples(data, self.bits_per_sample)
+        volumes, block_volumes = self.envelope.process(values)
+
+        if self.__f_volume is not None and block_volumes:
+            self.__f_volume.append(time.monotonic_ns(), block_volumes)
+            self.recorded_volume_samples += len(block_volumes)
+
+        if self.scope is not None:
+            self.scope.publish(values, volumes)
+
+
+class MultiReceiver:
+    def __init__(self, streams):
+        self.streams = streams
+
+    async def run(self):
+        if not os.path.exists("data"):
+            os.mkdir("data")
+        executor = ThreadPoolExecutor(1, thread_name_prefix="writer")
+        try:
+            for stream in self.streams:
+                if stream.executor is None:
+                    stream.executor = executor
+            await asyncio.gather(*(stream.run() for stream in self.streams))
+        finally:
+            executor.shutdown()
+
+    def stats(self):
+        return [stream.stat() for stream in self.streams]
+
+
+async def run_with_stats(receiver, stat_interval):
+    task = asyncio.ensure_future(receiver.run())
+    while not task.done():
+        await asyncio.wait([task], timeout=stat_interval)
+        stats = receiver.stats()
+        print("%s: %d/%d connected, %.0f B/s total" % (
+            datetime.now().strftime("%H:%M:%S"),
+            sum(stat["connected"] for stat in stats),
+            len(stats),
+            sum(stat["bytes_per_sec"] for stat in stats)
+        ))
+        for stat in stats:
+            print("  {name}: received {received} B, {bytes_per_sec:.0f} B/s, volume {volume:.2f}".format(**stat))
+
+
+def parse_sources(value):
+    address, _, ports = value.rpartition(":")
+    first, _, last = ports.partition("-")
+    return [(address or "127.0.0.1", port) for port in range(int(first), int(last or first) + 1)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sources", nargs="+", type=parse_sources, metavar="ADDRESS:PORT[-PORT]")
+    parser.add_argument("--package-size", type=int, default=4096)
+    parser.add_argument("--timeout", type=int, default=5000)
+    parser.add_argument("--password", default="0000")
+    parser.add_argument("--samples-per-sec", type=int, default=44100)
+    parser.add_argument("--bits-per-sample", type=int, default=16, choices=[8, 16])
+    parser.add_argument("--volume-T", type=int, default=10)
+    parser.add_argument("--volume-K", type=float, default=0.1)
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--record-volume", action="store_true")
+    parser.add_argument("--volume-format", choices=["binary", "text"], default="binary")
+    parser.add_argument("--stat-interval", type=float, default=5)
+    args = parser.parse_args()
+
+    receiver = MultiReceiver([
+        Stream(
+            "%s-%d" % source, source[0], source[1],
+            args.package_size, args.timeout, args.password,
+            args.samples_per_sec, args.bits_per_sample, args.volume_T, args.volume_K,
+            record=args.record, record_volume=args.record_volume,
+            binary_volume_log=args.volume_format == "binary"
+        )
+        for sources in args.sources for source in sources
+    ])
+    try:
+        asyncio.run(run_with_stats(receiver, args.stat_interval))
+    except KeyboardInterrupt:
+        pass
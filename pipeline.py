@@ -0,0 +1,173 @@
+import time
+from collections import deque
+from threading import Condition, Lock, Thread, current_thread
+import numpy as np
+
+
+class Chunk:
+    def __init__(self, data, values, volumes, block_volumes, timestamp_ns, meters=None):
+        self.data = data
+        self.values = values
+        self.volumes = volumes
+        self.block_volumes = block_volumes
+        self.timestamp_ns = timestamp_ns
+        self.meters = meters
+
+    def merge(self, other):
+        return Chunk(
+            self.data + other.data,
+            np.concatenate((self.values, other.values)),
+            np.concatenate((self.volumes, other.volumes)),
+            self.block_volumes + other.block_volumes,
+            other.timestamp_ns,
+            np.concatenate((self.meters, other.meters)) if self.meters is not None and other.meters is not None else None
+        )
+
+
+class Gap:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+class Stage:
+    POLICIES = ("drop-oldest", "block", "coalesce")
+
+    def __init__(self, name, process, policy="drop-oldest", max_queue=64, on_error=None):
+        if policy not in Stage.POLICIES:
+            raise ValueError("Stage: unknown policy: %s" % policy)
+        self.name = name
+        self.policy = policy
+        self.max_queue = max_queue
+        self.on_error = on_error
+
+        self.processed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.blocked = 0
+        self.blocked_time = 0
+        self.max_depth = 0
+        self.latency_total = 0
+        self.latency_max = 0
+
+        self.__process = process
+        self.__queue = deque()
+        self.__cond = Condition()
+        self.__running = False
+        self.__thread = None
+
+    def start(self):
+        self.__running = True
+        self.__thread = Thread(target=self.__target, name="Stage " + self.name, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        with self.__cond:
+            self.__running = False
+            self.__cond.notify_all()
+        if self.__thread is not None and self.__thread is not current_thread():
+            self.__thread.join()
+
+    def depth(self):
+        return len(self.__queue)
+
+    def stat(self):
+        return {
+            "name": self.name,
+            "policy": self.policy,
+            "depth": len(self.__queue),
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "blocked": self.blocked,
+            "blocked_time": self.blocked_time,
+            "latency_mean": self.latency_total / self.processed * 1000 if self.processed else 0,
+            "latency_max": self.latency_max * 1000
+        }
+
+    def put(self, chunk, t):
+        with self.__cond:
+            if not self.__running:
+                return
+            if len(self.__queue) >= self.max_queue:
+                if self.policy == "drop-oldest":
+                    self.__queue.popleft()
+                    self.dropped += 1
+                elif self.policy == "coalesce":
+                    first_t, last = self.__queue.pop()
+                    chunk = last.merge(chunk)
+                    t = first_t
+                    self.coalesced += 1
+                else:
+                    self.blocked += 1
+                    t0 = time.perf_counter()
+                    while len(self.__queue) >= self.max_queue and self.__running:
+                        self.__cond.wait()
+                    self.blocked_time += time.perf_counter() - t0
+                    if not self.__running:
+                        return
+            self.__queue.append((t, chunk))
+            self.max_depth = max(self.max_depth, len(self.__queue))
+            self.__cond.notify_all()
+
+    def __target(self):
+        while True:
+            with self.__cond:
+                while not self.__queue and self.__running:
+                    self.__cond.wait()
+                if not self.__queue:
+                    break
+                t, chunk = self.__queue.popleft()
+                self.__cond.notify_all()
+            try:
+                self.__process(chunk)
+            except Exception as e:
+                with self.__cond:
+                    self.__running = False
+                    self.__queue.clear()
+                    self.__cond.notify_all()
+                if self.on_error is not None:
+                    self.on_error(e)
+                else:
+                    print("Stage.__target: %s: %s" % (self.name, e))
+                break
+            latency = time.perf_counter() - t
+            self.processed += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+
+class Pipeline:
+    def __init__(self):
+        self.__stages = ()
+        self.__mutex = Lock()
+
+    def stages(self):
+        return self.__stages
+
+    def add(self, stage):
+        with self.__mutex:
+            stage.start()
+            self.__stages += (stage,)
+        return stage
+
+    def remove(self, stage):
+        with self.__mutex:
+            self.__stages = tuple(s for s in self.__stages if s is not stage)
+        stage.stop()
+
+    def publish(self, chunk):
+        t = time.perf_counter()
+        for stage in self.__stages:
+            stage.put(chunk, t)
+
+    def stats(self):
+        return [stage.stat() for stage in self.__stages]
+
+    def stop(self):
+        with self.__mutex:
+            stages = self.__stages
+            self.__stages = ()
+        for stage in stages:
+            stage.stop()
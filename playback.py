@@ -0,0 +1,225 @@
+import atexit
+from threading import Lock
+import numpy as np
+
+
+class OutputStream:
+    def __init__(self, pa, format, rate, frames_per_buffer):
+        import pyaudio
+
+        self.key = (format, rate, frames_per_buffer)
+        self.source = None
+        self.__sample_size = pyaudio.get_sample_size(format)
+        self.__continue = pyaudio.paContinue
+        self.__stream = pa.open(
+            format=format,
+            channels=1,
+            rate=rate,
+            output=True,
+            frames_per_buffer=frames_per_buffer,
+            stream_callback=self.__callback,
+            start=False
+        )
+
+    def start(self, source):
+        self.source = source
+        self.__stream.start_stream()
+
+    def stop(self):
+        try:
+            self.__stream.stop_stream()
+        finally:
+            self.source = None
+
+    def close(self):
+        self.source = None
+        self.__stream.close()
+
+    def __callback(self, in_data, frame_count, time_info, status):
+        source = self.source
+        if source is None:
+            return bytes(frame_count * self.__sample_size), self.__continue
+        return source.read(frame_count), self.__continue
+
+
+class AudioBackend:
+    def __init__(self, max_idle=2):
+        self.max_idle = max_idle
+        self.opened = 0
+        self.__pa = None
+        self.__idle = []
+        self.__mutex = Lock()
+
+    def acquire(self, format, rate, frames_per_buffer, source):
+        key = (format, rate, frames_per_buffer)
+        with self.__mutex:
+            if self.__pa is None:
+                import pyaudio
+                self.__pa = pyaudio.PyAudio()
+            stream = next((stream for stream in self.__idle if stream.key == key), None)
+            if stream is not None:
+                self.__idle.remove(stream)
+            else:
+                stream = OutputStream(self.__pa, format, rate, frames_per_buffer)
+                self.opened += 1
+        try:
+            stream.start(source)
+        except:
+            stream.close()
+            raise
+        return stream
+
+    def release(self, stream):
+        try:
+            stream.stop()
+        except:
+            stream.close()
+            raise
+        with self.__mutex:
+            if self.__pa is None:
+                stream.close()
+                return
+            self.__idle.append(stream)
+            while len(self.__idle) > self.max_idle:
+                self.__idle.pop(0).close()
+
+    def terminate(self):
+        with self.__mutex:
+            for stream in self.__idle:
+                try:
+                    stream.close()
+                except:
+                    pass
+            self.__idle = []
+            if self.__pa is not None:
+                self.__pa.terminate()
+                self.__pa = None
+
+
+backend = AudioBackend()
+atexit.register(backend.terminate)
+
+
+class Playback:
+    def __init__(
+        self, samples_per_sec, bits_per_sample,
+        target_latency=100, max_latency=500, policy="stretch", max_stretch=0.005, frames_per_buffer=1024
+    ):
+        if policy not in ("drop", "stretch"):
+            raise ValueError("Playback: unknown policy: %s" % policy)
+        self.samples_per_sec = samples_per_sec
+        self.bits_per_sample = bits_per_sample
+        self.policy = policy
+        # resampling shifts the pitch: 0.5% is about 9 cents and inaudible, 5% would already be 85 cents
+        self.max_stretch = max_stretch
+        self.frames_per_buffer = frames_per_buffer
+
+        self.written = 0
+        self.played = 0
+        self.underruns = 0
+        self.dropped = 0
+        self.stretched = 0
+        self.max_depth = 0
+
+        self.__dtype = np.int8 if bits_per_sample == 8 else np.dtype("<i2")
+        self.__base_target = max(int(samples_per_sec * target_latency / 1000), frames_per_buffer)
+        self.__target = self.__base_target
+        self.__max = max(int(samples_per_sec * max_latency / 1000), 2 * self.__target + frames_per_buffer)
+        self.__average = 0
+        self.__buffer = np.zeros(self.__max, dtype=self.__dtype)
+        self.__head = 0
+        self.__tail = 0
+        self.__buffering = True
+        self.__mutex = Lock()
+
+        self.__stream = None
+
+    def start(self):
+        import pyaudio
+
+        self.__stream = backend.acquire(
+            pyaudio.paInt8 if self.bits_per_sample == 8 else pyaudio.paInt16,
+            self.samples_per_sec, self.frames_per_buffer, self
+        )
+
+    def close(self):
+        if self.__stream is not None:
+            stream = self.__stream
+            self.__stream = None
+            backend.release(stream)
+
+    def depth(self):
+        return (self.__tail - self.__head) / self.samples_per_sec * 1000
+
+    def target_latency(self):
+        return self.__target / self.samples_per_sec * 1000
+
+    def stat(self):
+        return {
+            "depth": self.depth(),
+            "target": self.target_latency(),
+            "max_depth": self.max_depth / self.samples_per_sec * 1000,
+            "written": self.written,
+            "played": self.played,
+            "underruns": self.underruns,
+            "dropped": self.dropped,
+            "stretched": self.stretched
+        }
+
+    def write(self, data):
+        values = np.frombuffer(data, dtype=self.__dtype)
+        n = len(values)
+        with self.__mutex:
+            self.written += n
+            depth = self.__tail - self.__head + n
+            if depth > self.__max:
+                # the consumer has fallen behind the hard limit: skip forward to the target latency
+                drop = depth - self.__target
+                old = min(drop, self.__tail - self.__head)
+                self.__head += old
+                values = values[drop - old:]
+                n = len(values)
+                self.dropped += drop
+                depth = self.__target
+            self.__buffer[np.arange(self.__tail, self.__tail + n) % self.__max] = values
+            self.__tail += n
+            self.max_depth = max(self.max_depth, depth)
+
+    def read(self, frame_count):
+        out = np.zeros(frame_count, dtype=self.__dtype)
+        with self.__mutex:
+            depth = self.__tail - self.__head
+            if self.__buffering:
+                if depth < self.__target:
+                    return out.tobytes()
+                self.__buffering = False
+                self.__average = depth
+
+            # the target follows the network: it grows on every underrun and relaxes back over about half a minute
+            self.__target -= int((self.__target - self.__base_target) * frame_count / (self.samples_per_sec * 30))
+            self.__average += (depth - self.__average) * 0.05
+
+            n = frame_count
+            if self.policy == "stretch" and depth > frame_count:
+                error = (self.__average - self.__target) / self.__target
+                n = min(int(round(frame_count * (1 + min(max(error * self.max_stretch, -self.max_stretch), self.max_stretch)))), depth)
+            elif self.policy == "drop" and depth > (self.__target + self.__max) // 2:
+                self.__head += depth - self.__target
+                self.dropped += depth - self.__target
+                depth = self.__target
+
+            underrun = depth < n
+            if underrun:
+                self.underruns += 1
+                self.__buffering = True
+                self.__target = min(self.__target * 3 // 2, self.__max // 2)
+                n = depth
+            values = self.__buffer[np.arange(self.__head, self.__head + n) % self.__max]
+            if underrun or n == frame_count:
+                out[:n] = values
+            else:
+                out[:] = np.interp(np.linspace(0, n - 1, frame_count), np.arange(n), values)
+                self.stretched += n - frame_count
+            self.__head += n
+            self.played += n
+        return out.tobytes()
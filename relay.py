@@ -0,0 +1,220 @@
+import asyncio
+import argparse
+import hashlib
+import socket
+import time
+from datetime import datetime
+from core import make_play_cmd
+
+
+SEND_BUFFER = 64 * 1024
+
+
+class Client:
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+        self.sent = 0
+        self.skipped = 0
+        self.skipping = False
+
+
+class Relay:
+    def __init__(
+        self,
+        address, port, package_size, timeout, password, samples_per_sec, bits_per_sample,
+        listen_password=None, max_buffer=256 * 1024, slow_policy="drop", max_backoff=30
+    ):
+        if slow_policy not in ("drop", "skip"):
+            raise ValueError("Relay: unknown slow client policy: %s" % slow_policy)
+        self.address = address
+        self.port = port
+        self.package_size = package_size
+        self.timeout = timeout
+        self.password = password
+        self.samples_per_sec = samples_per_sec
+        self.bits_per_sample = bits_per_sample
+        self.listen_password = password if listen_password is None else listen_password
+        self.max_buffer = max_buffer
+        self.slow_policy = slow_policy
+        self.max_backoff = max_backoff
+
+        self.clients = []
+        self.connected = False
+        self.received = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def stat(self):
+        return {
+            "connected": self.connected,
+            "received": self.received,
+            "clients": len(self.clients),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "sent": sum(client.sent for client in self.clients),
+            "skipped": sum(client.skipped for client in self.clients),
+            "buffered": max((client.writer.transport.get_write_buffer_size() for client in self.clients), default=0)
+        }
+
+    async def handle(self, reader, writer):
+        name = "%s:%s" % writer.get_extra_info("peername")[:2]
+        client = None
+
+        async def read(n):
+            return await asyncio.wait_for(reader.readexactly(n), self.timeout / 1000)
+
+        try:
+            cmd = await read(1)
+            n = int.from_bytes(await read(4), "little")
+            p = await read(n) if n <= 256 else b""
+            samples_per_sec = int.from_bytes(await read(4), "little") if p else 0
+            bits_per_sample = int.from_bytes(await read(4), "little") if p else 0
+            # one upstream format for everybody: the relay does not resample
+            if (
+                cmd != b"\x03" or
+                p != hashlib.md5(self.listen_password.encode("utf-8")).hexdigest().encode("utf-8") or
+                samples_per_sec != self.samples_per_sec or
+                bits_per_sample != self.bits_per_sample
+            ):
+                self.rejected += 1
+                print("Relay.handle: %s: rejected %d Hz %d bit" % (name, samples_per_sec, bits_per_sample))
+                writer.write(b"\x00")
+                await writer.drain()
+                return
+            # small kernel buffers: a stalled receiver shows up in the transport buffer instead of lagging by megabytes
+            sock = writer.get_extra_info("socket")
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+            writer.write(b"\x01")
+            client = Client(name, writer)
+            self.clients.append(client)
+            self.accepted += 1
+            print("Relay.handle: %s: connected" % name)
+            while await reader.read(4096):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, OSError) as e:
+            print("Relay.handle: %s: %s" % (name, str(e) or type(e).__name__))
+        finally:
+            if client is not None and client in self.clients:
+                self.clients.remove(client)
+                print("Relay.handle: %s: disconnected, sent %d B, skipped %d B" % (name, client.sent, client.skipped))
+            writer.close()
+
+    def broadcast(self, data):
+        for client in list(self.clients):
+            transport = client.writer.transport
+            if transport.is_closing():
+                continue
+            buffered = transport.get_write_buffer_size()
+            if buffered + len(data) > self.max_buffer or (client.skipping and buffered > self.max_buffer // 2):
+                if self.slow_policy == "drop":
+                    # the others must not wait for it: the client reconnects and starts from live data
+                    self.clients.remove(client)
+                    self.dropped += 1
+                    print("Relay.broadcast: %s: dropped, %d B behind" % (client.name, buffered))
+                    transport.abort()
+                else:
+                    client.skipping = True
+                    client.skipped += len(data)
+                continue
+            client.skipping = False
+            transport.write(data)
+            client.sent += len(data)
+
+    async def upstream(self):
+        bytes_per_sample = self.bits_per_sample // 8
+        backoff = 0.5
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.address, self.port),
+                    self.timeout / 1000
+                )
+                writer.write(make_play_cmd(self.password, self.samples_per_sec, self.bits_per_sample))
+                await writer.drain()
+                data = await asyncio.wait_for(reader.read(1), self.timeout / 1000)
+                if data != b"\x01":
+                    raise RuntimeError("play cmd: unexpected response: %s" % data)
+                self.connected = True
+                print("Relay.upstream: connected to %s:%d" % (self.address, self.port))
+
+                # whole samples only, so skipping a chunk for a slow client keeps its stream aligned
+                rem = b""
+                while True:
+                    data = await asyncio.wait_for(reader.read(self.package_size), self.timeout / 1000)
+                    if not data:
+                        break
+                    backoff = 0.5
+                    data = rem + data
+                    n = len(data) - len(data) % bytes_per_sample
+                    rem = data[n:]
+                    self.received += n
+                    if n:
+                        self.broadcast(data[:n] if rem else data)
+                print("Relay.upstream: connection closed")
+            except Exception as e:
+                print("Relay.upstream: %s" % (str(e) or type(e).__name__))
+            finally:
+                self.connected = False
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def run(self, listen_address, listen_port):
+        server = await asyncio.start_server(self.handle, listen_address, listen_port)
+        print("Relay on %s:%d for %s:%d" % (listen_address, listen_port, self.address, self.port))
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.upstream())
+
+
+async def run_with_stats(relay, listen_address, listen_port, stat_interval):
+    task = asyncio.ensure_future(relay.run(listen_address, listen_port))
+    previous = None
+    while not task.done():
+        await asyncio.wait([task], timeout=stat_interval)
+        stat = relay.stat()
+        now = (time.monotonic(), time.process_time())
+        if previous is not None:
+            print("%s: upstream %s, %.0f B/s, %d clients, %d dropped, %d rejected, max %d B buffered, cpu %.1f%%" % (
+                datetime.now().strftime("%H:%M:%S"),
+                "connected" if stat["connected"] else "disconnected",
+                (stat["received"] - previous[2]) / (now[0] - previous[0]),
+                stat["clients"], stat["dropped"], stat["rejected"], stat["buffered"],
+                (now[1] - previous[1]) / (now[0] - previous[0]) * 100
+            ))
+        previous = now + (stat["received"],)
+    task.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="serve one transmitter stream to many receivers")
+    parser.add_argument("--address", default="127.0.0.1", help="transmitter address")
+    parser.add_argument("--port", type=int, default=9000, help="transmitter port")
+    parser.add_argument("--package-size", type=int, default=4096)
+    parser.add_argument("--timeout", type=int, default=5000)
+    parser.add_argument("--password", default="0000")
+    parser.add_argument("--samples-per-sec", type=int, default=44100)
+    parser.add_argument("--bits-per-sample", type=int, default=16, choices=[8, 16])
+    parser.add_argument("--listen-address", default="0.0.0.0")
+    parser.add_argument("--listen-port", type=int, default=9100)
+    parser.add_argument("--listen-password", help="password for receivers, the transmitter password by default")
+    parser.add_argument("--max-buffer", type=int, default=256 * 1024, help="bytes queued for one receiver")
+    parser.add_argument("--slow-policy", choices=["drop", "skip"], default="drop", help="what to do with a receiver over --max-buffer")
+    parser.add_argument("--max-backoff", type=float, default=30)
+    parser.add_argument("--stat-interval", type=float, default=10)
+    args = parser.parse_args()
+
+    relay = Relay(
+        args.address, args.port, args.package_size, args.timeout, args.password,
+        args.samples_per_sec, args.bits_per_sample,
+        args.listen_password, args.max_buffer, args.slow_policy, args.max_backoff
+    )
+    try:
+        asyncio.run(run_with_stats(relay, args.listen_address, args.listen_port, args.stat_interval))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,256 @@
+import time
+from threading import Condition, Thread
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from decimation import minmax_columns
+from spectrum import decimate_image
+
+
+class Frame:
+    def __init__(self, width, height, rgba, render_time):
+        self.width = width
+        self.height = height
+        self.rgba = rgba
+        self.render_time = render_time
+
+
+class Renderer:
+    METRIC = "draw_seconds"
+
+    def __init__(self, interval=200, width=640, height=480, dpi=100):
+        self.interval = interval
+        self.metrics = None
+        self.frames = 0
+        self.skipped = 0
+        self.render_time = 0
+        self.on_frame = None
+        self.cond = Condition()
+
+        self.__size = (max(width, 1), max(height, 1))
+        self.__dpi = dpi
+        self.__blit = True
+        self.__dirty = True
+        self.__frame = None
+        self.__running = False
+        self.__thread = None
+
+        # an Agg figure of its own: nothing here touches Qt, so it can draw away from the GUI thread
+        self.figure = Figure(figsize=(self.__size[0] / dpi, self.__size[1] / dpi), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.__background = None
+
+    def resize(self, width, height):
+        with self.cond:
+            if (width, height) != self.__size and width > 0 and height > 0:
+                self.__size = (width, height)
+                self.__dirty = True
+                self.cond.notify()
+
+    def redraw(self):
+        with self.cond:
+            self.__dirty = True
+            self.cond.notify()
+
+    def set_blit(self, blit):
+        # taken by the worker at the start of a frame, never halfway through one
+        with self.cond:
+            self.__blit = blit
+            self.__dirty = True
+            self.cond.notify()
+
+    def start(self):
+        if self.__thread is not None:
+            return
+        self.__running = True
+        self.__thread = Thread(target=self.__target, name=type(self).__name__, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.__running = False
+            self.cond.notify()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def take(self):
+        with self.cond:
+            frame = self.__frame
+            self.__frame = None
+        return frame
+
+    def render(self, dirty=False):
+        with self.cond:
+            dirty = dirty or self.__dirty
+            self.__dirty = False
+            size = self.__size
+            blit = self.__blit
+        return self.__render(dirty, size, blit)
+
+    def update(self, dirty):
+        # returns the animated artists after setting their data, None when there is nothing new to show
+        raise NotImplementedError
+
+    def __target(self):
+        next_time = time.perf_counter()
+        while True:
+            with self.cond:
+                self.cond.wait_for(
+                    lambda: not self.__running or self.__dirty,
+                    max(next_time - time.perf_counter(), 0)
+                )
+                if not self.__running:
+                    break
+
+            now = time.perf_counter()
+            interval = self.interval / 1000
+            if now >= next_time:
+                # a render that overran its slot gives the missed ticks up instead of catching up on them
+                missed = int((now - next_time) / interval)
+                self.skipped += missed
+                next_time += (missed + 1) * interval
+
+            try:
+                frame = self.render()
+            except Exception as e:
+                print("%s.__target: %s" % (type(self).__name__, e))
+                frame = None
+            if frame is None:
+                continue
+            with self.cond:
+                # the GUI did not get to the previous frame: it is replaced, not queued
+                if self.__frame is not None:
+                    self.skipped += 1
+                self.__frame = frame
+            self.frames += 1
+            self.render_time += frame.render_time
+            self.metrics and self.metrics.observe(self.METRIC, frame.render_time)
+            self.on_frame and self.on_frame()
+
+    def __render(self, dirty, size, blit):
+        t0 = time.perf_counter()
+        if dirty:
+            self.figure.set_size_inches(size[0] / self.__dpi, size[1] / self.__dpi)
+            self.__background = None
+
+        artists = self.update(dirty)
+        if artists is None:
+            return None
+
+        if blit and self.__background is not None:
+            self.canvas.restore_region(self.__background)
+        elif blit:
+            for artist in artists:
+                artist.set_visible(False)
+            self.canvas.draw()
+            self.__background = self.canvas.copy_from_bbox(self.figure.bbox)
+            for artist in artists:
+                artist.set_visible(True)
+        else:
+            self.__background = None
+            self.canvas.draw()
+        if blit:
+            for artist in artists:
+                self.figure.draw_artist(artist)
+
+        # a copy: the GUI paints it while the next frame is drawn into the canvas
+        rgba = np.asarray(self.canvas.buffer_rgba()).copy()
+        return Frame(rgba.shape[1], rgba.shape[0], rgba, time.perf_counter() - t0)
+
+
+class ScopeRenderer(Renderer):
+    def __init__(self, get_scope, interval=200, width=640, height=480, dpi=100):
+        super().__init__(interval, width, height, dpi)
+
+        self.__get_scope = get_scope
+        self.__decimation = True
+        self.__viewport_size = 1
+        self.__amplitude = 32768
+        self.__xmax = 1
+        self.__seq = None
+        self.__ax = self.figure.subplots()
+        self.__ax.grid(True)
+        self.__line1 = self.__ax.plot([], [])[0]
+        self.__line2 = self.__ax.plot([], [])[0]
+
+    def configure(self, viewport_size, amplitude):
+        # applied by the worker on the next frame, the figure is only ever touched from its thread
+        with self.cond:
+            self.__viewport_size = viewport_size
+            self.__amplitude = amplitude
+        self.redraw()
+
+    def set_decimation(self, decimation):
+        with self.cond:
+            self.__decimation = decimation
+        self.redraw()
+
+    def update(self, dirty):
+        with self.cond:
+            decimation = self.__decimation
+            viewport_size = self.__viewport_size
+            amplitude = self.__amplitude
+        if dirty:
+            self.__ax.set_xlim([0, viewport_size])
+            self.__ax.set_ylim([-amplitude, amplitude])
+            self.__xmax = viewport_size
+            self.__seq = None
+        seq = self.__seq
+        scope = self.__get_scope()
+        scale = self.__xmax / max(scope.size, 1)
+        if decimation:
+            seq, values, volumes = scope.read_minmax(seq)
+            if values is not None:
+                columns = int(self.__ax.bbox.width)
+                x, y = minmax_columns(*values, columns)
+                self.__line1.set_data(x * (scale * scope.bucket_size), y)
+                x, y = minmax_columns(*volumes, columns)
+                self.__line2.set_data(x * (scale * scope.bucket_size), y)
+        else:
+            seq, values, volumes = scope.read(seq)
+            if values is not None:
+                t = np.arange(scope.size) * scale
+                self.__line1.set_data(t, values)
+                self.__line2.set_data(t, volumes)
+        if values is None and not dirty:
+            return None
+        self.__seq = seq
+        return [self.__line1, self.__line2]
+
+
+class SpectrumRenderer(Renderer):
+    METRIC = "spectrum_draw_seconds"
+
+    def __init__(self, get_spectrogram, interval=200, width=640, height=480, dpi=100):
+        super().__init__(interval, width, height, dpi)
+
+        self.__get_spectrogram = get_spectrogram
+        self.__seq = None
+        self.__limits = None
+        self.__spectrum_ax, self.__spectrogram_ax = self.figure.subplots(2, 1)
+        self.__spectrum_ax.grid(True)
+        self.__spectrum_ax.set_ylim([-120, 0])
+        self.__spectrum_line = self.__spectrum_ax.plot([], [])[0]
+        self.__spectrogram_image = self.__spectrogram_ax.imshow(
+            np.full((1, 1), -120), aspect="auto", origin="lower", vmin=-120, vmax=0, interpolation="nearest"
+        )
+
+    def update(self, dirty):
+        spectrogram = self.__get_spectrogram()
+        limits = (spectrogram.samples_per_sec, spectrogram.history)
+        if dirty or limits != self.__limits:
+            self.__spectrum_ax.set_xlim([0, max(spectrogram.samples_per_sec / 2, 1)])
+            self.__spectrogram_image.set_extent([-spectrogram.history, 0, 0, max(spectrogram.samples_per_sec / 2, 1)])
+            self.__limits = limits
+            self.__seq = None
+            dirty = True
+        seq, image = spectrogram.read(self.__seq)
+        if image is not None:
+            self.__spectrum_line.set_data(spectrogram.frequencies, image[-1])
+            bbox = self.__spectrogram_ax.bbox
+            self.__spectrogram_image.set_data(decimate_image(image, int(bbox.width), int(bbox.height)).T)
+        elif not dirty:
+            return None
+        self.__seq = seq
+        return [self.__spectrum_line, self.__spectrogram_image]
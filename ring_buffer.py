@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, size, dtype, shape=(), fill=0):
+        self.size = size
+        self.__data = np.full((2 * size,) + shape, fill, dtype=dtype)
+        self.__pos = 0
+
+    def append(self, values):
+        n = len(values)
+        if n == 0 or self.size == 0:
+            return
+        if n >= self.size:
+            values = values[-self.size:]
+            self.__data[:self.size] = values
+            self.__data[self.size:] = values
+            self.__pos = 0
+            return
+        end = self.__pos + n
+        if end <= self.size:
+            self.__data[self.__pos:end] = values
+            self.__data[self.__pos + self.size:end + self.size] = values
+        else:
+            k = self.size - self.__pos
+            self.__data[self.__pos:self.size] = values[:k]
+            self.__data[self.__pos + self.size:] = values[:k]
+            self.__data[:n - k] = values[k:]
+            self.__data[self.size:self.size + n - k] = values[k:]
+        self.__pos = end % self.size
+
+    def view(self):
+        return self.__data[self.__pos:self.__pos + self.size]
+
+    def snapshot(self):
+        return self.view().copy()
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,47 @@
+import time
+import numpy as np
+from ring_buffer import RingBuffer
+from decimation import MinMaxDecimator
+
+
+class Scope:
+    def __init__(self, size, values_dtype=np.int16, buckets=8192):
+        self.size = size
+        self.values = RingBuffer(size, values_dtype)
+        self.volumes = RingBuffer(size, np.float32)
+        self.bucket_size = max(size // buckets, 1)
+        self.values_minmax = MinMaxDecimator(size, self.bucket_size, values_dtype)
+        self.volumes_minmax = MinMaxDecimator(size, self.bucket_size, np.float32)
+        self.seq = 0
+
+    def publish(self, values, volumes):
+        self.seq += 1
+        self.values.append(values)
+        self.volumes.append(volumes)
+        self.values_minmax.append(values)
+        self.volumes_minmax.append(volumes.astype(np.float32))
+        self.seq += 1
+
+    def __read(self, last_seq, buffers):
+        while True:
+            seq = self.seq
+            if seq == last_seq:
+                return (seq,) + (None,) * len(buffers)
+            if seq % 2 == 1:
+                time.sleep(0)
+                continue
+            snapshots = tuple(buffer.snapshot() for buffer in buffers)
+            if self.seq == seq:
+                return (seq,) + snapshots
+
+    def read(self, last_seq=None):
+        return self.__read(last_seq, (self.values, self.volumes))
+
+    def read_minmax(self, last_seq=None):
+        seq, values_mins, values_maxs, volumes_mins, volumes_maxs = self.__read(last_seq, (
+            self.values_minmax.mins, self.values_minmax.maxs,
+            self.volumes_minmax.mins, self.volumes_minmax.maxs
+        ))
+        if values_mins is None:
+            return seq, None, None
+        return seq, (values_mins, values_maxs), (volumes_mins, volumes_maxs)
@@ -0,0 +1,109 @@
+import os
+import time
+import numpy as np
+from wav import MAX_DATA_SIZE, FinishedWriters, WavWriter
+
+
+class SegmentedRecorder:
+    def __init__(
+        self, samples_per_sec, bits_per_sample, segment_seconds=None, segment_size=None,
+        compression=None, index=None, header_interval=5, max_gap_fill=60, directory="data"
+    ):
+        self.samples_per_sec = samples_per_sec
+        self.bits_per_sample = bits_per_sample
+        self.compression = compression
+        self.max_gap_fill = max_gap_fill
+        self.directory = directory
+        self.segments = 0
+        self.recorded = 0
+        self.filename = None
+
+        # a segment never outgrows the 32-bit RIFF sizes and is at least a second long,
+        # so second-resolution names stay unique
+        bytes_per_sample = bits_per_sample // 8
+        limit = min(segment_size or MAX_DATA_SIZE, MAX_DATA_SIZE) // bytes_per_sample
+        if segment_seconds:
+            limit = min(limit, int(segment_seconds * samples_per_sec))
+        self.segment_samples = max(limit, samples_per_sec)
+
+        self.__dtype = np.int8 if bits_per_sample == 8 else np.dtype("<i2")
+        self.__header_interval = header_interval
+        self.__index = index
+        self.__time = time.time()
+        self.__samples = 0
+        self.__f = None
+        self.__session = None
+        self.__finished = FinishedWriters()
+
+    def stored(self):
+        f = self.__f
+        return self.__finished.stored() + (f.stored if f is not None else 0)
+
+    def dropped(self):
+        # bytes the writer could not keep up with, written as silence in their place
+        f = self.__f
+        return self.__finished.dropped() + (f.dropped if f is not None else 0)
+
+    def process(self, values, volumes, timestamp_ns=None):
+        recorded = self.recorded
+        n = len(values)
+        i = 0
+        while i < n:
+            if self.__f is None:
+                self.__open()
+            k = min(n - i, self.segment_samples - self.__samples)
+            self.__f.write(values[i:i + k].tobytes())
+            self.recorded += k * values.itemsize
+            if self.__session is not None:
+                self.__session.append(values[i:i + k], volumes[i:i + k])
+            self.__samples += k
+            self.__time += k / self.samples_per_sec
+            i += k
+            if self.__samples == self.segment_samples:
+                self.__close()
+        return self.recorded - recorded
+
+    def gap(self, start, end):
+        # silence keeps the files on the wall clock for short outages, longer ones are only marked in the index
+        samples = int(min(end - start, self.max_gap_fill) * self.samples_per_sec)
+        values = np.zeros(self.samples_per_sec, dtype=self.__dtype)
+        volumes = np.zeros(len(values))
+        for i in range(0, samples, len(values)):
+            n = min(len(values), samples - i)
+            self.process(values[:n], volumes[:n])
+        if self.__session is not None:
+            self.__session.gap(start, end, samples)
+        self.__time += end - start - samples / self.samples_per_sec
+
+    def close(self):
+        try:
+            self.__close()
+        finally:
+            self.__finished.join()
+
+    def __open(self):
+        self.filename = os.path.join(
+            self.directory,
+            time.strftime("%Y-%m-%d %H-%M-%S.wav", time.localtime(self.__time)) + (".gz" if self.compression else "")
+        )
+        self.__f = WavWriter(
+            self.filename, self.samples_per_sec, 1, self.bits_per_sample,
+            header_interval=self.__header_interval, compression=self.compression
+        )
+        if self.__index is not None:
+            self.__session = self.__index.begin(
+                self.filename, self.__time, self.samples_per_sec, self.bits_per_sample,
+                None if self.compression else 44
+            )
+        self.__samples = 0
+        self.segments += 1
+
+    def __close(self):
+        f = self.__f
+        session = self.__session
+        self.__f = None
+        self.__session = None
+        if session is not None:
+            session.end()
+        if f is not None:
+            self.__finished.add(f)
@@ -0,0 +1,295 @@
+import argparse
+import os
+import queue
+import sqlite3
+import time
+from datetime import datetime
+from threading import Thread
+import numpy as np
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    start REAL,
+    end REAL,
+    samples_per_sec INTEGER,
+    bits_per_sample INTEGER,
+    header_size INTEGER
+);
+CREATE TABLE IF NOT EXISTS seconds (
+    session_id INTEGER,
+    time REAL,
+    volume_min REAL,
+    volume_max REAL,
+    volume_mean REAL,
+    peak INTEGER,
+    byte_offset INTEGER,
+    PRIMARY KEY (session_id, time)
+);
+CREATE TABLE IF NOT EXISTS gaps (
+    session_id INTEGER,
+    start REAL,
+    end REAL,
+    filled REAL
+);
+CREATE INDEX IF NOT EXISTS seconds_time ON seconds (time);
+CREATE INDEX IF NOT EXISTS seconds_volume_max ON seconds (volume_max, time);
+CREATE INDEX IF NOT EXISTS sessions_start ON sessions (start, end);
+"""
+
+
+class SessionIndex:
+    def __init__(self, filename="data/index.sqlite", commit_interval=1):
+        self.filename = filename
+        self.__commit_interval = commit_interval
+        self.__queue = queue.Queue()
+        connection = sqlite3.connect(filename)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+        self.__thread = Thread(target=self.__target, daemon=True)
+        self.__thread.start()
+
+    def begin(self, path, start, samples_per_sec, bits_per_sample, header_size=44):
+        self.__queue.put(("begin", path, start, samples_per_sec, bits_per_sample, header_size))
+        return IndexedSession(self.__queue, path, start, samples_per_sec, bits_per_sample, header_size)
+
+    def close(self):
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def __target(self):
+        connection = sqlite3.connect(self.filename)
+        ids = {}
+        commit_time = None
+        while True:
+            try:
+                op = self.__queue.get(timeout=None if commit_time is None else max(commit_time - time.monotonic(), 0))
+            except queue.Empty:
+                op = ()
+            if op is None:
+                break
+            try:
+                if op and op[0] == "begin":
+                    _, path, start, samples_per_sec, bits_per_sample, header_size = op
+                    connection.execute("DELETE FROM seconds WHERE session_id IN (SELECT id FROM sessions WHERE path = ?)", (path,))
+                    connection.execute("DELETE FROM gaps WHERE session_id IN (SELECT id FROM sessions WHERE path = ?)", (path,))
+                    connection.execute("DELETE FROM sessions WHERE path = ?", (path,))
+                    ids[path] = connection.execute(
+                        "INSERT INTO sessions (path, start, end, samples_per_sec, bits_per_sample, header_size) VALUES (?, ?, ?, ?, ?, ?)",
+                        (path, start, start, samples_per_sec, bits_per_sample, header_size)
+                    ).lastrowid
+                elif op and op[0] == "seconds":
+                    _, path, rows, end = op
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO seconds VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(ids[path],) + row for row in rows]
+                    )
+                    connection.execute("UPDATE sessions SET end = ? WHERE id = ?", (end, ids[path]))
+                elif op and op[0] == "gap":
+                    _, path, start, end, filled = op
+                    connection.execute("INSERT INTO gaps VALUES (?, ?, ?, ?)", (ids[path], start, end, filled))
+                if op and commit_time is None:
+                    commit_time = time.monotonic() + self.__commit_interval
+                elif not op:
+                    connection.commit()
+                    commit_time = None
+            except Exception as e:
+                print("SessionIndex.__target: %s" % e)
+        connection.commit()
+        connection.close()
+
+
+class IndexedSession:
+    def __init__(self, queue, path, start, samples_per_sec, bits_per_sample, header_size):
+        self.path = path
+        self.__queue = queue
+        self.__start = start
+        self.__samples_per_sec = samples_per_sec
+        self.__bytes_per_sample = bits_per_sample // 8
+        self.__header_size = header_size
+        self.__samples = 0
+        self.__reset(0)
+
+    def __reset(self, sample):
+        self.__time = self.__start + sample // self.__samples_per_sec
+        # compressed files have no byte offsets to seek to, header_size is None for them
+        self.__offset = None if self.__header_size is None else self.__header_size + sample * self.__bytes_per_sample
+        self.__min = float("inf")
+        self.__max = float("-inf")
+        self.__sum = 0
+        self.__count = 0
+        self.__peak = 0
+
+    def __row(self):
+        return (
+            self.__time, self.__min, self.__max, self.__sum / self.__count,
+            self.__peak, self.__offset
+        )
+
+    def append(self, values, volumes):
+        n = len(values)
+        if n == 0:
+            return
+        starts = np.unique(np.concatenate(([0], np.arange(-self.__samples % self.__samples_per_sec, n, self.__samples_per_sec))))
+        mins = np.minimum.reduceat(volumes, starts).tolist()
+        maxs = np.maximum.reduceat(volumes, starts).tolist()
+        sums = np.add.reduceat(volumes, starts, dtype=np.float64).tolist()
+        peaks = np.maximum.reduceat(np.abs(values.astype(np.int32)), starts).tolist()
+        counts = np.diff(np.append(starts, n)).tolist()
+
+        rows = []
+        for k, start in enumerate(starts.tolist()):
+            sample = self.__samples + start
+            if sample % self.__samples_per_sec == 0:
+                if self.__count:
+                    rows.append(self.__row())
+                self.__reset(sample)
+            self.__min = min(self.__min, mins[k])
+            self.__max = max(self.__max, maxs[k])
+            self.__sum += sums[k]
+            self.__count += counts[k]
+            self.__peak = max(self.__peak, peaks[k])
+        self.__samples += n
+
+        if rows:
+            self.__queue.put(("seconds", self.path, rows, self.__start + self.__samples / self.__samples_per_sec))
+
+    def gap(self, start, end, filled_samples):
+        filled = filled_samples / self.__samples_per_sec
+        self.__queue.put(("gap", self.path, start, end, filled))
+        if end - start > filled:
+            # the file skips the unfilled part: later rows keep wall-clock times, byte offsets stay exact
+            if self.__count:
+                self.__queue.put(("seconds", self.path, [self.__row()], self.__start + self.__samples / self.__samples_per_sec))
+            self.__start += end - start - filled
+            self.__reset(self.__samples)
+
+    def end(self):
+        self.__queue.put((
+            "seconds", self.path,
+            [self.__row()] if self.__count else [],
+            self.__start + self.__samples / self.__samples_per_sec
+        ))
+        self.__reset(self.__samples)
+
+
+def connect(filename="data/index.sqlite"):
+    return sqlite3.connect("file:%s?mode=ro" % filename, uri=True)
+
+
+def find_sessions(connection, start, end):
+    return connection.execute(
+        "SELECT path, start, end, samples_per_sec, bits_per_sample FROM sessions WHERE end >= ? AND start < ? ORDER BY start",
+        (start, end)
+    ).fetchall()
+
+
+def find_gaps(connection, start, end):
+    return connection.execute(
+        "SELECT s.path, g.start, g.end, g.filled FROM gaps g JOIN sessions s ON s.id = g.session_id "
+        "WHERE g.end >= ? AND g.start < ? ORDER BY g.start",
+        (start, end)
+    ).fetchall()
+
+
+def find_loud(connection, start, end, threshold):
+    return connection.execute(
+        "SELECT s.path, x.time, x.volume_max, x.peak, x.byte_offset FROM seconds x JOIN sessions s ON s.id = x.session_id "
+        "WHERE x.time >= ? AND x.time < ? AND x.volume_max >= ? ORDER BY x.time",
+        (start, end, threshold)
+    ).fetchall()
+
+
+def rebuild(args):
+    from core import VolumeEnvelope
+    from wav_reader import WavReader
+
+    index = SessionIndex(args.index)
+    for name in sorted(os.listdir(args.directory)):
+        if not name.endswith((".wav", ".wav.gz")):
+            continue
+        path = os.path.join(args.directory, name)
+        try:
+            start = datetime.strptime(name[:19], "%Y-%m-%d %H-%M-%S").timestamp()
+            with WavReader(path) as reader:
+                envelope = VolumeEnvelope(int(reader.samples_per_sec * args.volume_T / 100), args.volume_K)
+                session = index.begin(
+                    path, start, reader.samples_per_sec, reader.bits_per_sample, None if reader.compressed else 44
+                )
+                samples = 0
+                for values in reader.chunks(1 << 20):
+                    volumes, _ = envelope.process(values)
+                    session.append(values, volumes)
+                    samples += len(values)
+                session.end()
+                print("%s: %.0f s" % (path, samples / reader.samples_per_sec))
+        except Exception as e:
+            print("%s: %s" % (path, e))
+    index.close()
+
+
+def parse_time(value):
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S" if ":" in value else "%Y-%m-%d").timestamp()
+
+
+def format_time(t):
+    return datetime.fromtimestamp(t).strftime("%Y.%m.%d %H:%M:%S")
+
+
+def sessions(args):
+    with connect(args.index) as connection:
+        for path, start, end, samples_per_sec, bits_per_sample in find_sessions(connection, args.start, args.end):
+            print("%s - %s  %d Hz %d bit  %s" % (format_time(start), format_time(end), samples_per_sec, bits_per_sample, path))
+
+
+def gaps(args):
+    with connect(args.index) as connection:
+        for path, start, end, filled in find_gaps(connection, args.start, args.end):
+            print("%s - %s  %.1f s, %.1f s filled with silence  %s" % (format_time(start), format_time(end), end - start, filled, path))
+
+
+def loud(args):
+    t0 = time.perf_counter()
+    with connect(args.index) as connection:
+        rows = find_loud(connection, args.start, args.end, args.threshold)
+    for path, t, volume_max, peak, byte_offset in rows:
+        print("%s  volume %.2f  peak %d  %s%s" % (
+            format_time(t), volume_max, peak, path, "" if byte_offset is None else " @ %d" % byte_offset
+        ))
+    print("%d seconds found in %.1f ms" % (len(rows), (time.perf_counter() - t0) * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default="data/index.sqlite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("rebuild", help="index existing recordings")
+    p.add_argument("directory", nargs="?", default="data")
+    p.add_argument("--volume-T", type=int, default=10)
+    p.add_argument("--volume-K", type=float, default=0.1)
+    p.set_defaults(func=rebuild)
+
+    p = subparsers.add_parser("sessions")
+    p.add_argument("--from", dest="start", type=parse_time, default=0)
+    p.add_argument("--to", dest="end", type=parse_time, default=float("inf"))
+    p.set_defaults(func=sessions)
+
+    p = subparsers.add_parser("gaps", help="connection losses inside recordings")
+    p.add_argument("--from", dest="start", type=parse_time, default=0)
+    p.add_argument("--to", dest="end", type=parse_time, default=float("inf"))
+    p.set_defaults(func=gaps)
+
+    p = subparsers.add_parser("loud", help="seconds with volume above a threshold")
+    p.add_argument("--from", dest="start", type=parse_time, default=0)
+    p.add_argument("--to", dest="end", type=parse_time, default=float("inf"))
+    p.add_argument("--threshold", type=float, default=16384)
+    p.set_defaults(func=loud)
+
+    args = parser.parse_args()
+    args.func(args)
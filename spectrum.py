@@ -0,0 +1,58 @@
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from ring_buffer import RingBuffer
+
+
+FLOOR = -200
+
+
+class Spectrogram:
+    def __init__(self, samples_per_sec, fft_size=1024, hop=512, history=10, amplitude=32768):
+        self.samples_per_sec = samples_per_sec
+        self.fft_size = fft_size
+        self.hop = hop
+        self.history = history
+        self.columns = max(int(history * samples_per_sec / hop), 1)
+        self.frequencies = np.fft.rfftfreq(fft_size) * samples_per_sec
+        self.image = RingBuffer(self.columns, np.float32, (len(self.frequencies),), FLOOR)
+        self.frames = 0
+        self.seq = 0
+
+        self.__window = np.hanning(fft_size).astype(np.float32)
+        # a full-scale sine reads 0 dB
+        self.__scale = 2 / (self.__window.sum() * amplitude)
+        self.__pending = np.zeros(0, dtype=np.float32)
+
+    def process(self, values):
+        samples = np.concatenate((self.__pending, values.astype(np.float32)))
+        count = (len(samples) - self.fft_size) // self.hop + 1 if len(samples) >= self.fft_size else 0
+        if count > 0:
+            frames = sliding_window_view(samples, self.fft_size)[:count * self.hop:self.hop]
+            spectra = np.abs(np.fft.rfft(frames * self.__window, axis=1)) * self.__scale
+            db = (20 * np.log10(np.maximum(spectra, 10 ** (FLOOR / 20)))).astype(np.float32)
+            self.seq += 1
+            self.image.append(db)
+            self.frames += count
+            self.seq += 1
+        self.__pending = samples[count * self.hop:]
+
+    def read(self, last_seq=None):
+        while True:
+            seq = self.seq
+            if seq == last_seq:
+                return seq, None
+            if seq % 2 == 1:
+                time.sleep(0)
+                continue
+            image = self.image.snapshot()
+            if self.seq == seq:
+                return seq, image
+
+
+def decimate_image(image, columns, rows):
+    # max-pool a (time, frequency) image down to about one cell per pixel so peaks stay visible
+    columns = np.unique(np.linspace(0, len(image), max(min(columns, len(image)), 1), endpoint=False).astype(int))
+    image = np.maximum.reduceat(image, columns, axis=0)
+    rows = np.unique(np.linspace(0, image.shape[1], max(min(rows, image.shape[1]), 1), endpoint=False).astype(int))
+    return np.maximum.reduceat(image, rows, axis=1)
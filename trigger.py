@@ -0,0 +1,144 @@
+import os
+import time
+import numpy as np
+from ring_buffer import RingBuffer
+from wav import FinishedWriters, WavWriter
+
+
+class TriggeredRecorder:
+    def __init__(
+        self, samples_per_sec, bits_per_sample, attack, release,
+        pre_roll=5, hold=2, index=None, header_interval=5, compression=None, directory="data"
+    ):
+        # at or below 0 every sample counts as loud and an event never closes
+        if attack <= 0 or release <= 0:
+            raise ValueError("TriggeredRecorder: attack and release must be positive: %s, %s" % (attack, release))
+        self.samples_per_sec = samples_per_sec
+        self.bits_per_sample = bits_per_sample
+        self.attack = attack
+        self.release = min(release, attack)
+        self.compression = compression
+        self.directory = directory
+        self.events = 0
+        self.recorded = 0
+        self.filename = None
+
+        self.__hold = max(int(hold * samples_per_sec), 1)
+        self.__header_interval = header_interval
+        self.__index = index
+        self.__values = RingBuffer(int(pre_roll * samples_per_sec), np.int8 if bits_per_sample == 8 else np.int16)
+        self.__volumes = RingBuffer(len(self.__values), np.float32)
+        self.__filled = 0
+        self.__quiet = 0
+        self.__wall_offset = time.time() - time.monotonic()
+
+        self.__f = None
+        self.__session = None
+        self.__finished = FinishedWriters()
+
+    def stored(self):
+        f = self.__f
+        return self.__finished.stored() + (f.stored if f is not None else 0)
+
+    def dropped(self):
+        # bytes the writer could not keep up with, written as silence in their place
+        f = self.__f
+        return self.__finished.dropped() + (f.dropped if f is not None else 0)
+
+    def triggered(self):
+        return self.__f is not None
+
+    def process(self, values, volumes, timestamp_ns):
+        # timestamp_ns is the receive time of the chunk, i.e. of the sample right after it
+        recorded = self.recorded
+        end_time = timestamp_ns / 1e9 + self.__wall_offset
+        n = len(values)
+        i = 0
+        while i < n:
+            if self.__f is None:
+                loud = np.flatnonzero(volumes[i:] >= self.attack)
+                if len(loud) == 0:
+                    self.__keep(values[i:], volumes[i:])
+                    break
+                k = i + int(loud[0])
+                self.__keep(values[i:k], volumes[i:k])
+                self.__open(end_time - (n - k) / self.samples_per_sec)
+                i = k
+            else:
+                k = self.__find_release(volumes[i:])
+                if k is None:
+                    self.__write(values[i:], volumes[i:])
+                    break
+                self.__write(values[i:i + k], volumes[i:i + k])
+                self.__close()
+                i += k
+        return self.recorded - recorded
+
+    def gap(self, start, end):
+        # a connection loss ends the event, audio from before it is no pre-roll for the next one
+        self.__close()
+        self.__filled = 0
+
+    def close(self):
+        try:
+            self.__close()
+        finally:
+            self.__finished.join()
+
+    def __keep(self, values, volumes):
+        self.__values.append(values)
+        self.__volumes.append(volumes)
+        self.__filled = min(self.__filled + len(values), self.__values.size)
+
+    def __find_release(self, volumes):
+        # quiet runs: the one carried over from the previous chunk, then one after every loud sample
+        n = len(volumes)
+        loud = np.flatnonzero(volumes >= self.release)
+        starts = np.concatenate(([-self.__quiet], loud + 1))
+        lengths = np.append(loud, n) - starts
+        hit = np.flatnonzero(lengths >= self.__hold)
+        if len(hit):
+            self.__quiet = 0
+            return int(starts[hit[0]]) + self.__hold
+        self.__quiet = n - int(starts[-1])
+        return None
+
+    def __open(self, onset):
+        start = onset - self.__filled / self.samples_per_sec
+        self.filename = os.path.join(
+            self.directory,
+            time.strftime("%Y-%m-%d %H-%M-%S", time.localtime(start)) + ".%03d.wav" % (start % 1 * 1000) +
+            (".gz" if self.compression else "")
+        )
+        self.__f = WavWriter(
+            self.filename, self.samples_per_sec, 1, self.bits_per_sample,
+            header_interval=self.__header_interval, compression=self.compression
+        )
+        if self.__index is not None:
+            self.__session = self.__index.begin(
+                self.filename, start, self.samples_per_sec, self.bits_per_sample, None if self.compression else 44
+            )
+        self.events += 1
+        self.__quiet = 0
+        if self.__filled:
+            self.__write(
+                self.__values.view()[-self.__filled:].copy(),
+                self.__volumes.view()[-self.__filled:].copy()
+            )
+            self.__filled = 0
+
+    def __write(self, values, volumes):
+        self.__f.write(values.tobytes())
+        self.recorded += values.nbytes
+        if self.__session is not None:
+            self.__session.append(values, volumes)
+
+    def __close(self):
+        f = self.__f
+        session = self.__session
+        self.__f = None
+        self.__session = None
+        if session is not None:
+            session.end()
+        if f is not None:
+            self.__finished.add(f)
@@ -0,0 +1,206 @@
+import argparse
+import os
+import struct
+import time
+from datetime import datetime
+import numpy as np
+
+
+HEADER = struct.Struct("<4sHHd")
+NAMES = struct.Struct("<H")
+MAGIC = b"ACVL"
+VERSION = 1
+METERS_VERSION = 2
+RECORD = np.dtype([("t", "<u4"), ("volume", "<f4")])
+
+
+def record_dtype(meters):
+    # version 2 keeps the version 1 layout and appends one float per meter, the count is in the header
+    return np.dtype([("t", "<u4"), ("volume", "<f4")] + [("m%d" % i, "<f4") for i in range(meters)])
+
+
+class VolumeLogWriter:
+    def __init__(self, filename, batch_size=4096, flush_interval=1, meters=(), executor=None):
+        self.filename = filename
+        self.meters = list(meters)
+        self.recorded = 0
+        self.error = None
+
+        self.__batch = np.zeros(batch_size, dtype=record_dtype(len(self.meters)))
+        self.__n = 0
+        self.__flush_interval = flush_interval
+        self.__flush_time = time.monotonic()
+        self.__start_ns = time.monotonic_ns()
+        # with an executor the batches go to the disk there, e.g. off an event loop
+        self.__executor = executor
+
+        self.__f = open(filename, "wb")
+        try:
+            if self.meters:
+                names = ",".join(self.meters).encode("utf-8")
+                self.__f.write(HEADER.pack(MAGIC, METERS_VERSION, len(self.meters), time.time()))
+                self.__f.write(NAMES.pack(len(names)) + names)
+            else:
+                self.__f.write(HEADER.pack(MAGIC, VERSION, 0, time.time()))
+        except:
+            self.__f.close()
+            raise
+
+    def append(self, timestamp_ns, volumes, meters=None):
+        if self.error is not None:
+            raise RuntimeError("VolumeLogWriter.append: %s" % self.error)
+        t = ((timestamp_ns - self.__start_ns) // 1000000) & 0xFFFFFFFF
+        i = 0
+        while i < len(volumes):
+            k = min(len(volumes) - i, len(self.__batch) - self.__n)
+            self.__batch["t"][self.__n:self.__n + k] = t
+            self.__batch["volume"][self.__n:self.__n + k] = volumes[i:i + k]
+            if meters is not None:
+                for j in range(len(self.meters)):
+                    self.__batch["m%d" % j][self.__n:self.__n + k] = meters[i:i + k, j]
+            self.__n += k
+            i += k
+            if self.__n == len(self.__batch):
+                self.flush()
+        self.recorded += len(volumes)
+        if self.__n and time.monotonic() >= self.__flush_time + self.__flush_interval:
+            self.flush()
+
+    def flush(self):
+        data = self.__batch[:self.__n].tobytes()
+        self.__n = 0
+        self.__flush_time = time.monotonic()
+        if self.__executor is not None:
+            self.__executor.submit(self.__write, data).add_done_callback(self.__done)
+        else:
+            self.__write(data)
+
+    def close(self):
+        # with an executor call it there too, the batches submitted before are written by then
+        try:
+            data = self.__batch[:self.__n].tobytes()
+            self.__n = 0
+            self.__write(data)
+        finally:
+            self.__f.close()
+        if self.error is not None:
+            raise RuntimeError("VolumeLogWriter.close: %s" % self.error)
+
+    def __write(self, data):
+        self.__f.write(data)
+        self.__f.flush()
+
+    def __done(self, future):
+        if future.exception() is not None:
+            self.error = str(future.exception())
+
+
+class TextVolumeLogWriter:
+    def __init__(self, filename, meters=(), executor=None):
+        self.filename = filename
+        self.meters = list(meters)
+        self.recorded = 0
+        self.error = None
+        self.__executor = executor
+        self.__f = open(filename, "w")
+
+    def append(self, timestamp_ns, volumes, meters=None):
+        if self.error is not None:
+            raise RuntimeError("TextVolumeLogWriter.append: %s" % self.error)
+        now = datetime.now().strftime("%Y.%m.%d %H:%M:%S.%f")
+        if meters is None or not self.meters:
+            text = "".join("{}\t{:.2f}\n".format(now, volume) for volume in volumes)
+        else:
+            text = "".join(
+                "{}\t{:.2f}\t{}\n".format(now, volume, "\t".join("{:.2f}".format(value) for value in row))
+                for volume, row in zip(volumes, meters.tolist())
+            )
+        if self.__executor is not None:
+            self.__executor.submit(self.__f.write, text).add_done_callback(self.__done)
+        else:
+            self.__f.write(text)
+        self.recorded += len(volumes)
+
+    def close(self):
+        self.__f.close()
+        if self.error is not None:
+            raise RuntimeError("TextVolumeLogWriter.close: %s" % self.error)
+
+    def __done(self, future):
+        if future.exception() is not None:
+            self.error = str(future.exception())
+
+
+def read_header(f):
+    magic, version, count, wall_time = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version not in (VERSION, METERS_VERSION):
+        raise RuntimeError("read_volume_log: unsupported file: %s" % f.name)
+    names = []
+    if version == METERS_VERSION:
+        n, = NAMES.unpack(f.read(NAMES.size))
+        names = f.read(n).decode("utf-8").split(",")[:count]
+    return wall_time, names
+
+
+def read_volume_log_chunks(filename, chunk_size):
+    # times and volumes of at most chunk_size records at a time, the millisecond wrap is carried across chunks
+    with open(filename, "rb") as f:
+        wall_time, names = read_header(f)
+        dtype = record_dtype(len(names))
+        last = None
+        wraps = 0
+        while True:
+            data = f.read(chunk_size * dtype.itemsize)
+            records = np.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype)
+            if not len(records):
+                break
+            t = records["t"].astype(np.int64)
+            steps = wraps + np.cumsum(np.diff(t, prepend=t[0] if last is None else last) < 0)
+            last = int(t[-1])
+            wraps = int(steps[-1])
+            yield wall_time + (t + (steps << 32)) / 1000, records["volume"]
+
+
+def read_volume_log(filename, meters=False):
+    with open(filename, "rb") as f:
+        wall_time, names = read_header(f)
+        data = f.read()
+    dtype = record_dtype(len(names))
+    records = np.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype)
+    t = records["t"].astype(np.int64)
+    if len(t):
+        t += np.concatenate(([0], np.cumsum(np.diff(t) < 0))) << 32
+    if meters:
+        return wall_time + t / 1000, records["volume"], {name: records["m%d" % i] for i, name in enumerate(names)}
+    return wall_time + t / 1000, records["volume"]
+
+
+def export_text(src, dst, meters=False):
+    times, volumes, levels = read_volume_log(src, meters=True)
+    columns = [values.tolist() for values in levels.values()] if meters else []
+    with open(dst, "w") as f:
+        for i, (t, volume) in enumerate(zip(times.tolist(), volumes.tolist())):
+            f.write("{}\t{:.2f}{}\n".format(
+                datetime.fromtimestamp(t).strftime("%Y.%m.%d %H:%M:%S.%f"), volume,
+                "".join("\t{:.2f}".format(column[i]) for column in columns)
+            ))
+
+
+def export(args):
+    for src in args.src:
+        dst = os.path.splitext(src)[0] + ".txt"
+        export_text(src, dst, args.meters)
+        print("%s -> %s" % (src, dst))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("export", help="convert a binary volume log to the text layout")
+    p.add_argument("src", nargs="+")
+    p.add_argument("--meters", action="store_true", help="append the meter columns after the volume")
+    p.set_defaults(func=export)
+
+    args = parser.parse_args()
+    args.func(args)
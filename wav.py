@@ -0,0 +1,282 @@
+import io
+import os
+import time
+import zlib
+from threading import Condition, Lock, Thread
+
+
+MAX_DATA_SIZE = 0xFFFFFFFF - 36
+
+
+def write_wav_header(f, samples_per_sec, channels, bits_per_sample, data_size=0):
+    """
+    DWORD rId; //"RIFF" = 0x46464952
+    DWORD rLen; //36 + dLen
+    DWORD wId; //"WAVE" = 0x45564157
+    DWORD fId; //"fmt " = 0x20746D66
+    DWORD fLen; //16
+    WORD wFormatTag; //1 (WAVE_FORMAT_PCM)
+    WORD nChannels;
+    DWORD nSamplesPerSec;
+    DWORD nAvgBytesPerSec;
+    WORD nBlockAlign;
+    WORD wBitsPerSample;
+    DWORD dId; //"data" = 0x61746164
+    DWORD dLen;
+    """
+
+    # the sizes saturate instead of wrapping past 4 GB, readers take the data up to the end of the file
+    data_size = min(data_size, MAX_DATA_SIZE)
+    data = (
+        int(0x46464952).to_bytes(4, "little") +
+        int(36 + data_size).to_bytes(4, "little") +
+        int(0x45564157).to_bytes(4, "little") +
+        int(0x20746D66).to_bytes(4, "little") +
+        int(16).to_bytes(4, "little") +
+        int(1).to_bytes(2, "little") +
+        int(channels).to_bytes(2, "little") +
+        int(samples_per_sec).to_bytes(4, "little") +
+        int(samples_per_sec * channels * bits_per_sample / 8).to_bytes(4, "little") +
+        int(channels * bits_per_sample / 8).to_bytes(2, "little") +
+        int(bits_per_sample).to_bytes(2, "little") +
+        int(0x61746164).to_bytes(4, "little") +
+        int(data_size).to_bytes(4, "little")
+    )
+
+    f.write(data)
+
+
+def fix_wav_header(f, recorded):
+    recorded = min(recorded, MAX_DATA_SIZE)
+    f.seek(4)
+    f.write(int(36 + recorded).to_bytes(4, "little"))
+
+    f.seek(40)
+    f.write(int(recorded).to_bytes(4, "little"))
+
+
+def gzip_header(samples_per_sec, channels, bits_per_sample, data_size=0):
+    # a stored (level 0) gzip member always has the same length, so it can be rewritten in place
+    # when the size is known; the samples follow in a second member
+    f = io.BytesIO()
+    write_wav_header(f, samples_per_sec, channels, bits_per_sample, data_size)
+    compressor = zlib.compressobj(0, zlib.DEFLATED, 31)
+    return compressor.compress(f.getvalue()) + compressor.flush()
+
+
+class WavWriter:
+    def __init__(
+        self, filename, samples_per_sec, channels, bits_per_sample,
+        block_size=64 * 1024, max_backlog=64 * 1024 * 1024, header_interval=5, compression=None, level=1,
+        executor=None
+    ):
+        if compression not in (None, "gzip"):
+            raise ValueError("WavWriter: unknown compression: %s" % compression)
+        self.filename = filename
+        self.recorded = 0
+        self.written = 0
+        self.stored = 0
+        self.dropped = 0
+        self.writes = 0
+        self.error = None
+
+        self.__block_size = block_size
+        self.__max_backlog = max_backlog
+        self.__header_interval = header_interval
+        self.__header_time = time.monotonic()
+        self.__buffer = bytearray()
+        self.__silence = 0
+        self.__closing = False
+        self.__done = False
+        self.__cond = Condition()
+        self.__format = (samples_per_sec, channels, bits_per_sample)
+        self.__compressor = zlib.compressobj(level, zlib.DEFLATED, 31) if compression else None
+
+        # with an executor many writers share its threads instead of one thread each,
+        # the lock keeps the passes over one file in order
+        self.__executor = executor
+        self.__scheduled = False
+        self.__lock = Lock()
+
+        # buffered, a raw write may take only part of a block; blocks larger than the buffer go straight through
+        self.__f = open(filename, "w+b")
+        try:
+            if self.__compressor is not None:
+                self.__f.write(gzip_header(samples_per_sec, channels, bits_per_sample))
+            else:
+                write_wav_header(self.__f, samples_per_sec, channels, bits_per_sample)
+        except:
+            self.__f.close()
+            raise
+
+        if executor is None:
+            self.__thread = Thread(target=self.__target)
+            self.__thread.start()
+
+    def write(self, data):
+        with self.__cond:
+            if self.error is not None:
+                raise RuntimeError("WavWriter.write: %s" % self.error)
+            # dropped audio comes back as silence once there is room again, the file keeps every
+            # sample position and the offsets the recorders count stay exact
+            room = self.__max_backlog - len(self.__buffer)
+            if self.__silence:
+                fill = min(self.__silence, room)
+                self.__buffer += bytes(fill)
+                self.__silence -= fill
+                self.recorded += fill
+                room -= fill
+            if self.__silence or len(data) > room:
+                self.__silence += len(data)
+                self.dropped += len(data)
+            else:
+                self.__buffer += data
+                self.recorded += len(data)
+            if len(self.__buffer) >= self.__block_size:
+                self.__cond.notify()
+                # the header is refreshed on the pass after a full block, an idle stream keeps its last one
+                if self.__executor is not None and not self.__scheduled:
+                    self.__scheduled = True
+                    self.__executor.submit(self.__run)
+
+    def finish(self):
+        # the writer thread flushes the backlog and closes the file on its own, close() waits for it
+        with self.__cond:
+            self.__closing = True
+            self.__cond.notify()
+        if self.__executor is not None:
+            self.__executor.submit(self.__run)
+
+    def finished(self):
+        return self.__done
+
+    def close(self):
+        if self.__executor is None:
+            self.finish()
+            self.__thread.join()
+        else:
+            # blocks on the disk, from an event loop call it through run_in_executor
+            with self.__cond:
+                self.__closing = True
+            self.__run()
+        if self.error is not None:
+            raise RuntimeError("WavWriter.close: %s" % self.error)
+
+    def __target(self):
+        try:
+            while True:
+                with self.__cond:
+                    self.__cond.wait_for(
+                        lambda: self.__closing or len(self.__buffer) >= self.__block_size,
+                        max(self.__header_time + self.__header_interval - time.monotonic(), 0)
+                    )
+                if self.__flush():
+                    break
+        except Exception as e:
+            self.__fail("WavWriter.__target", e)
+        self.__close_file()
+
+    def __run(self):
+        with self.__lock:
+            if self.__done:
+                return
+            with self.__cond:
+                self.__scheduled = False
+            try:
+                if not self.__flush():
+                    return
+            except Exception as e:
+                self.__fail("WavWriter.__run", e)
+            self.__close_file()
+
+    def __flush(self):
+        with self.__cond:
+            closing = self.__closing
+            data = self.__buffer
+            n = len(data) if closing else len(data) // self.__block_size * self.__block_size
+            self.__buffer = bytearray(memoryview(data)[n:])
+            silence = self.__silence if closing else 0
+            self.__silence -= silence
+            self.recorded += silence
+
+        data = memoryview(data)
+        for i in range(0, n, self.__block_size):
+            self.__write(data[i:i + self.__block_size])
+        zeros = bytes(min(silence, self.__block_size))
+        for i in range(0, silence, self.__block_size):
+            self.__write(zeros[:min(silence - i, self.__block_size)])
+        self.__f.flush()
+        self.written += n + silence
+
+        if closing or time.monotonic() >= self.__header_time + self.__header_interval:
+            if self.__compressor is not None:
+                # a sync flush keeps everything written so far decodable after a crash
+                self.__write(None, zlib.Z_FINISH if closing else zlib.Z_SYNC_FLUSH)
+                self.__f.seek(0)
+                self.__f.write(gzip_header(*self.__format, self.written))
+            else:
+                fix_wav_header(self.__f, self.written)
+            self.__f.seek(0, os.SEEK_END)
+            self.__header_time = time.monotonic()
+        return closing
+
+    def __fail(self, where, e):
+        print("%s: %s" % (where, e))
+        with self.__cond:
+            self.error = str(e)
+            self.__buffer = bytearray()
+            self.__silence = 0
+
+    def __close_file(self):
+        try:
+            self.__f.close()
+        except:
+            pass
+        self.__done = True
+
+    def __write(self, data, flush=None):
+        if self.__compressor is not None:
+            data = self.__compressor.compress(data) if flush is None else self.__compressor.flush(flush)
+            if not data:
+                return
+        self.__f.write(data)
+        self.stored += len(data)
+        self.writes += 1
+
+
+class FinishedWriters:
+    # rotated files are flushed behind the recording stage, the next one opens without waiting for the disk;
+    # stored() counts the bytes of every file handed over, joined or not
+    def __init__(self):
+        self.__writers = []
+        self.__stored = 0
+        self.__dropped = 0
+
+    def stored(self):
+        return self.__stored + sum(f.stored for f in self.__writers)
+
+    def dropped(self):
+        return self.__dropped + sum(f.dropped for f in self.__writers)
+
+    def add(self, f):
+        f.finish()
+        self.__writers.append(f)
+        self.join(False)
+
+    def join(self, wait=True):
+        writers = []
+        error = None
+        for f in self.__writers:
+            if wait or f.finished():
+                try:
+                    f.close()
+                except Exception as e:
+                    error = e
+                self.__stored += f.stored
+                self.__dropped += f.dropped
+            else:
+                writers.append(f)
+        self.__writers = writers
+        if error is not None:
+            raise error
+
@@ -0,0 +1,264 @@
+import argparse
+import mmap
+import zlib
+import numpy as np
+
+
+HEADER_SIZE = 44
+
+
+def read_gzip(f, chunk_size=1 << 20):
+    # member by member, a file cut short by a crash still yields everything up to its last flush;
+    # the output is capped per call so a run of silence never inflates in one piece
+    decompressor = zlib.decompressobj(31)
+    raw = b""
+    while True:
+        if not raw:
+            raw = f.read(chunk_size)
+            if not raw:
+                return
+        data = decompressor.decompress(raw, chunk_size)
+        if decompressor.eof:
+            raw = decompressor.unused_data
+            decompressor = zlib.decompressobj(31)
+        else:
+            raw = decompressor.unconsumed_tail
+        if data:
+            yield data
+
+
+class WavReader:
+    def __init__(self, filename):
+        self.filename = filename
+        self.compressed = filename.endswith(".gz")
+        self.__mm = None
+        self.__f = open(filename, "rb")
+        try:
+            if self.compressed:
+                # streamed on every pass instead of decompressed into memory
+                header = b""
+                for data in read_gzip(self.__f, HEADER_SIZE):
+                    header += data
+                    if len(header) >= HEADER_SIZE:
+                        break
+                header = header[:HEADER_SIZE]
+            else:
+                self.__mm = mmap.mmap(self.__f.fileno(), 0, access=mmap.ACCESS_READ)
+                header = self.__mm[:HEADER_SIZE]
+        except:
+            self.__f.close()
+            raise
+
+        if (
+            len(header) < HEADER_SIZE or
+            header[0:4] != b"RIFF" or header[8:12] != b"WAVE" or
+            header[12:16] != b"fmt " or header[36:40] != b"data" or
+            int.from_bytes(header[20:22], "little") != 1
+        ):
+            self.close()
+            raise RuntimeError("WavReader: unsupported file: %s" % filename)
+
+        self.channels = int.from_bytes(header[22:24], "little")
+        self.samples_per_sec = int.from_bytes(header[24:28], "little")
+        self.bits_per_sample = int.from_bytes(header[34:36], "little")
+        self.block_align = int.from_bytes(header[32:34], "little")
+        self.__dtype = np.int8 if self.bits_per_sample == 8 else np.dtype("<i2")
+
+        if self.compressed:
+            # the header is rewritten at every sync flush, so it counts what is decodable after a crash;
+            # chunks() still streams whatever follows
+            available = int.from_bytes(header[40:44], "little")
+            self.samples = None
+        else:
+            # the data chunk always runs to the end of the file, the size in the header may be
+            # stale after a crash or wrapped past 4 GB
+            available = len(self.__mm) - HEADER_SIZE
+        self.data_size = available - available % self.block_align
+
+        if not self.compressed:
+            self.samples = np.frombuffer(
+                self.__mm,
+                dtype=self.__dtype,
+                count=self.data_size * 8 // self.bits_per_sample,
+                offset=HEADER_SIZE
+            )
+            if self.channels > 1:
+                self.samples = self.samples.reshape(-1, self.channels)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.samples = None
+        try:
+            self.__mm.close()
+        except:
+            pass
+        self.__f.close()
+
+    def __len__(self):
+        return self.data_size // self.block_align
+
+    def duration(self):
+        return len(self) / self.samples_per_sec
+
+    def index(self, t):
+        return min(max(int(round(t * self.samples_per_sec)), 0), len(self))
+
+    def chunks(self, chunk_size=1 << 20, first=0, last=None):
+        # sample arrays of at most chunk_size frames from the first frame up to the last one
+        if not self.compressed:
+            last = len(self) if last is None else last
+            for i in range(first, last, chunk_size):
+                yield self.samples[i:min(i + chunk_size, last)]
+            return
+
+        self.__f.seek(0)
+        skip = HEADER_SIZE + first * self.block_align
+        rest = b""
+        i = 0
+        for data in read_gzip(self.__f, chunk_size * self.block_align):
+            if skip:
+                n = min(skip, len(data))
+                skip -= n
+                data = data[n:]
+            data = rest + data
+            n = min(len(data) - len(data) % self.block_align, chunk_size * self.block_align)
+            rest = data[n:]
+            if not n:
+                continue
+            chunk = np.frombuffer(data, dtype=self.__dtype, count=n * 8 // self.bits_per_sample)
+            if self.channels > 1:
+                chunk = chunk.reshape(-1, self.channels)
+            if last is not None:
+                chunk = chunk[:last - first - i]
+            if len(chunk):
+                yield chunk
+            i += len(chunk)
+            if last is not None and first + i >= last:
+                return
+
+    def read(self, first=0, last=None):
+        if not self.compressed:
+            return self.samples[first:len(self) if last is None else last]
+        chunks = list(self.chunks(first=first, last=last))
+        if not chunks:
+            return np.empty((0, self.channels) if self.channels > 1 else 0, dtype=self.__dtype)
+        return np.concatenate(chunks)
+
+    def slice(self, start=0, end=None):
+        return self.read(self.index(start), self.index(self.duration() if end is None else end))
+
+    def envelope(self, window, start=0, end=None, chunk_size=1 << 20):
+        first = self.index(start)
+        last = None if end is None else self.index(end)
+        n = max(int(round(window * self.samples_per_sec)), 1)
+        chunk_size = max(chunk_size // n, 1) * n
+
+        mins = []
+        maxs = []
+        rms = []
+        rest = None
+        for chunk in self.chunks(chunk_size, first, last):
+            if self.channels > 1:
+                chunk = chunk.mean(axis=1)
+            # gzip chunks follow the decompressor, so windows are cut from whatever is carried over
+            if rest is not None:
+                chunk = np.concatenate((rest, chunk))
+            k = len(chunk) - len(chunk) % n
+            rest = chunk[k:] if k < len(chunk) else None
+            if k:
+                self.__envelope(chunk[:k], n, mins, maxs, rms)
+        if rest is not None:
+            self.__envelope(rest, n, mins, maxs, rms)
+
+        if not mins:
+            return np.empty(0), np.empty(0), np.empty(0)
+        return np.concatenate(mins), np.concatenate(maxs), np.concatenate(rms)
+
+    @staticmethod
+    def __envelope(chunk, n, mins, maxs, rms):
+        index = np.arange(0, len(chunk), n)
+        mins.append(np.minimum.reduceat(chunk, index))
+        maxs.append(np.maximum.reduceat(chunk, index))
+        squares = np.add.reduceat(np.square(chunk, dtype=np.float64), index)
+        counts = np.diff(np.append(index, len(chunk)))
+        rms.append(np.sqrt(squares / counts))
+
+
+def info(args):
+    with WavReader(args.filename) as reader:
+        print("%s: %d Hz, %d bit, %d channel(s), %.3f s" % (
+            args.filename, reader.samples_per_sec, reader.bits_per_sample, reader.channels, reader.duration()
+        ))
+
+
+def envelope(args):
+    with WavReader(args.filename) as reader:
+        mins, maxs, rms = reader.envelope(args.window, args.start, args.end)
+        for i, (mn, mx, r) in enumerate(zip(mins.tolist(), maxs.tolist(), rms.tolist())):
+            print("{:.3f}\t{}\t{}\t{:.2f}".format(args.start + i * args.window, mn, mx, r))
+
+
+def replay(args):
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+    from core import AcPlayer
+
+    ac_player = AcPlayer()
+    ac_player.replay(args.filename, args.package_size, args.speed, args.volume_T, args.volume_K, args.viewport_size)
+    if args.play:
+        ac_player.start_play()
+
+    fig, ax = plt.subplots()
+    ax.set_xlim([0, args.viewport_size])
+    amplitude = 128 if ac_player.bits_per_sample() == 8 else 32768
+    ax.set_ylim([-amplitude, amplitude])
+    _, values, volumes = ac_player.scope.read()
+    t = np.arange(ac_player.scope.size) * (args.viewport_size / ac_player.scope.size)
+    line1 = ax.plot(t, values)[0]
+    line2 = ax.plot(t, volumes)[0]
+
+    def animate(_):
+        _, values, volumes = ac_player.scope.read()
+        line1.set_ydata(values)
+        line2.set_ydata(volumes)
+        return [line1, line2]
+
+    an = animation.FuncAnimation(fig, animate, interval=200, cache_frame_data=False, blit=True)  # noqa: F841
+    ax.grid(True)
+    plt.show()
+    if ac_player.connected():
+        ac_player.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("info")
+    p.add_argument("filename")
+    p.set_defaults(func=info)
+
+    p = subparsers.add_parser("envelope", help="min/max/RMS per window")
+    p.add_argument("filename")
+    p.add_argument("--window", type=float, default=1, help="[s]")
+    p.add_argument("--start", type=float, default=0, help="[s]")
+    p.add_argument("--end", type=float, default=None, help="[s]")
+    p.set_defaults(func=envelope)
+
+    p = subparsers.add_parser("replay", help="feed a recording through AcPlayer and plot it")
+    p.add_argument("filename")
+    p.add_argument("--package-size", type=int, default=4096)
+    p.add_argument("--speed", type=float, default=1, help="multiple of real time, 0 for as fast as possible")
+    p.add_argument("--volume-T", type=int, default=10)
+    p.add_argument("--volume-K", type=float, default=0.1)
+    p.add_argument("--viewport-size", type=int, default=20000)
+    p.add_argument("--play", action="store_true")
+    p.set_defaults(func=replay)
+
+    args = parser.parse_args()
+    args.func(args)